@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from pwime.bps import apply_patch
+
+if TYPE_CHECKING:
+    import argparse
+
+
+def run_cli(args: argparse.Namespace) -> None:
+    apply_patch(args.base_iso, args.patch, args.output)
+    print(f"Wrote {args.output}.")
@@ -1,47 +1,317 @@
 from __future__ import annotations
 
-import json
+import collections
+import heapq
+import os
 import typing
-from concurrent.futures import ThreadPoolExecutor
-from pathlib import Path
+import weakref
+from concurrent.futures import ProcessPoolExecutor
 
 from retro_data_structures.asset_manager import AssetManager
-from retro_data_structures.file_provider import IsoFileProvider
-from retro_data_structures.base_resource import AssetId, BaseResource, NameOrAssetId
+from retro_data_structures.file_provider import FileProvider
+from retro_data_structures.base_resource import AssetId, BaseResource, NameOrAssetId, RawResource
 from retro_data_structures.game_check import Game
 
+from pwime.asset_name_index import AssetNameIndex, get_asset_names
+from pwime.file_provider import provider_path
+from pwime.manifest import IsoIdentity
+from pwime.parsed_cache import (
+    CACHED_ASSET_TYPES,
+    PICKLING_ERRORS,
+    ParsedAssetCache,
+    dump_resource_for_build,
+    load_resource,
+)
+from pwime.util.lru_cache import LruCache
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from retro_data_structures.asset_manager import FileWriter
+    from retro_data_structures.base_resource import AssetType, Resource
+
 T = typing.TypeVar("T", bound=BaseResource)
 
 
-type Providers = dict[Game, IsoFileProvider]
+type Providers = dict[Game, FileProvider]
+
+DEFAULT_MEMORY_BUDGET = 128 * 1024 * 1024
+DEFAULT_DECOMPRESSED_BUDGET = 64 * 1024 * 1024
+
+
+def _encode_resource(pickled_resource: bytes) -> bytes:
+    return load_resource(pickled_resource, None).build()
+
+
+type TypeIndex = dict[AssetType, tuple[AssetId, ...]]
+
+_pak_type_indices: weakref.WeakKeyDictionary[FileProvider, TypeIndex] = weakref.WeakKeyDictionary()
+
+
+def _pak_type_index(manager: AssetManager) -> TypeIndex:
+    """Sorted asset ids of each type in the paks of the manager's provider. Only calculated once per provider."""
+    index = _pak_type_indices.get(manager.provider)
+    if index is None:
+        by_type: dict[AssetType, set[AssetId]] = collections.defaultdict(set)
+        for asset_id in manager.pak_group.all_asset_ids():
+            by_type[manager.pak_group.get_asset_type(asset_id)].add(asset_id)
+
+        index = {asset_type: tuple(sorted(ids)) for asset_type, ids in by_type.items()}
+        _pak_type_indices[manager.provider] = index
+
+    return index
 
 
 class OurAssetManager(AssetManager):
-    provider: IsoFileProvider
-    memory_files: dict[NameOrAssetId, BaseResource]
-    asset_names: dict[AssetId, str]
+    """
+    Keeps parsed assets in memory, separated in two groups:
+    - memory_files: assets that were only read, which are discarded when flushing. The least recently used are
+      discarded once their size goes over `memory_budget`, measured by their decompressed size when known.
+    - dirty_files: assets that were modified, see `mark_dirty`. Only these are encoded when flushing.
+      These are never discarded before flushing.
+    Assets can also have deferred changes, see `defer_change`, which are applied when the asset is first requested.
+    Below these, decompressed_files keeps the decompressed bytes of assets as they're in the paks, up to
+    `decompressed_budget`, so parsing an asset again doesn't need to decompress it again.
+    With `cache_parsed_assets`, slow to parse assets are also kept on disk across sessions, see `ParsedAssetCache`.
+    """
+
+    provider: FileProvider
+    memory_files: LruCache[AssetId, BaseResource]
+    dirty_files: dict[AssetId, BaseResource]
+    decompressed_files: LruCache[AssetId, bytes]
+    deferred_changes: dict[AssetId, list[Callable[[], None]]]
+    parsed_cache: ParsedAssetCache | None
+    _type_index: TypeIndex | None = None
 
-    def __init__(self, provider: IsoFileProvider, target_game: Game):
+    def __init__(
+        self,
+        provider: FileProvider,
+        target_game: Game,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        cache_parsed_assets: bool = False,
+        decompressed_budget: int = DEFAULT_DECOMPRESSED_BUDGET,
+    ):
         super().__init__(provider, target_game)
-        self.memory_files = {}
+        self.memory_files = LruCache(memory_budget)
+        self.dirty_files = {}
+        self.decompressed_files = LruCache(decompressed_budget)
+        self.deferred_changes = {}
+        self.parsed_cache = None
+        if cache_parsed_assets:
+            self.parsed_cache = ParsedAssetCache(IsoIdentity.from_path(provider_path(provider)))
+
+    @property
+    def asset_names(self) -> AssetNameIndex:
+        """The known names of assets, shared with all other managers of the same game."""
+        return get_asset_names(self.target_game)
+
+    def _get_type_index(self) -> TypeIndex:
+        if self._type_index is None:
+            index = _pak_type_index(self)
+            if self._modified_resources:
+                modified = self._modified_resources
+                by_type = {
+                    asset_type: [asset_id for asset_id in ids if asset_id not in modified]
+                    for asset_type, ids in index.items()
+                }
+                for asset_id, resource in modified.items():
+                    by_type.setdefault(resource.type, []).append(asset_id)
+                index = {asset_type: tuple(sorted(ids)) for asset_type, ids in by_type.items()}
+
+            self._type_index = index
+
+        return self._type_index
+
+    def asset_ids_of_types(self, asset_types: Iterable[AssetType]) -> list[AssetId]:
+        """All asset ids with any of the given types, sorted. Much faster than checking the type of every asset."""
+        index = self._get_type_index()
+        return list(heapq.merge(*(index.get(asset_type, ()) for asset_type in set(asset_types))))
+
+    def add_new_asset(self, name: str, new_data: Resource) -> AssetId:
+        self._type_index = None
+        return super().add_new_asset(name, new_data)
+
+    def replace_asset(self, asset_id: NameOrAssetId, new_data: Resource, *, keep_in_memory: bool = True) -> AssetId:
+        self._type_index = None
+        self.decompressed_files.pop(self.resolve_asset_id(asset_id))
+        return super().replace_asset(asset_id, new_data, keep_in_memory=keep_in_memory)
+
+    def get_decompressed_asset(self, path: NameOrAssetId) -> bytes:
+        """Gets the decompressed data of the given asset, only decompressing it when not in decompressed_files."""
+        asset_id = self.resolve_asset_id(path)
+        data = self.decompressed_files.get(asset_id)
+        if data is None:
+            data = self.get_raw_asset(asset_id).data
+            # Modified assets don't come from the paks, and are already in memory anyway
+            if asset_id not in self._modified_resources:
+                self.decompressed_files.put(asset_id, data, len(data))
+        return data
+
+    def get_parsed_asset(self, asset_id: NameOrAssetId, *, type_hint: type[T] = BaseResource) -> T:
+        """Same as in AssetManager, except the data comes from `get_decompressed_asset`."""
+        return self._parse_decompressed(asset_id, self.get_decompressed_asset(asset_id), type_hint)
+
+    def _parse_decompressed(self, asset_id: NameOrAssetId, data: bytes, type_hint: type[T]) -> T:
+        format_class = self.get_asset_format(asset_id)
 
-        asset_names_path = Path(__file__).parent.joinpath("asset_names", f"{target_game.name}.json")
-        try:
-            with asset_names_path.open() as f:
-                name_to_id: dict = json.load(f)
+        if format_class is BaseResource:
+            if type_hint is BaseResource:
+                raise ValueError(f"pak listed {self.get_asset_type(asset_id)}, this case requires type_hint to be set")
 
-            self.asset_names = {asset_id: name for name, asset_id in name_to_id.items()}
+            format_class = type_hint
 
-        except FileNotFoundError:
-            self.asset_names = {}
+        elif type_hint is not BaseResource and type_hint != format_class:
+            raise ValueError(f"type_hint was {type_hint}, pak listed {format_class}")
 
-    def flush_modified_assets(self):
-        with ThreadPoolExecutor() as executor:
-            for name, resource in self.memory_files.items():
-                executor.submit(self.replace_asset, name, resource)
-        self.memory_files = {}
+        return format_class.parse(data, target_game=self.target_game, asset_manager=self)
+
+    def asset_ids_by_pak(self, asset_ids: Iterable[AssetId]) -> list[list[AssetId]]:
+        """Splits the asset ids into groups that live in the same pak, so each group only needs to read a single pak."""
+        shards: dict[str, list[AssetId]] = collections.defaultdict(list)
+        for asset_id in asset_ids:
+            shards[min(self.find_paks(asset_id))].append(asset_id)
+        return list(shards.values())
+
+    def flush_modified_assets(self, jobs: int | None = None) -> None:
+        """
+        Encodes all dirty assets, so they're included in `save_modifications`. All parsed assets are discarded.
+        Deferred changes are applied first, as they also make their assets dirty.
+        Encoding is done by a pool of `jobs` processes, as it's pure Python. With a single job, or a single CPU when
+        not given, it's done in this one. Assets that can't be sent to another process are encoded in this one instead.
+        """
+        self.apply_deferred_changes()
+
+        pickled_resources: dict[AssetId, bytes] = {}
+        encode_here: list[AssetId] = []
+
+        # Starting the processes and sending the assets costs more than encoding them here, unless it's done in parallel
+        if (jobs or os.cpu_count() or 1) == 1:
+            encode_here.extend(self.dirty_files.keys())
+        else:
+            for asset_id, resource in self.dirty_files.items():
+                try:
+                    pickled_resources[asset_id] = dump_resource_for_build(resource)
+                except PICKLING_ERRORS:
+                    encode_here.append(asset_id)
+
+        # Starting the processes isn't worth it for a single asset
+        if len(pickled_resources) > 1:
+            with ProcessPoolExecutor(jobs) as executor:
+                futures = {
+                    asset_id: executor.submit(_encode_resource, pickled)
+                    for asset_id, pickled in pickled_resources.items()
+                }
+                for asset_id, future in futures.items():
+                    resource_type = self.dirty_files[asset_id].resource_type()
+                    self.replace_asset(asset_id, RawResource(resource_type, future.result()))
+        else:
+            encode_here.extend(pickled_resources.keys())
+
+        for asset_id in encode_here:
+            self.replace_asset(asset_id, self.dirty_files[asset_id], keep_in_memory=False)
+
+        self.memory_files.clear()
+        self.dirty_files = {}
+
+    def save_modifications(self, output: FileWriter) -> None:
+        """
+        Same as in AssetManager, except the modifications are kept afterward, so saving again writes them again.
+        AssetManager forgets them, as it expects to read the game from `output` from then on.
+        """
+        modified_resources = self._modified_resources
+        custom_asset_ids = self._custom_asset_ids
+        super().save_modifications(output)
+        self._modified_resources = modified_resources
+        self._custom_asset_ids = custom_asset_ids
+
+    def encode_modified_assets(self) -> dict[AssetId, RawResource]:
+        """
+        Encodes every modified asset, without flushing them. Deferred changes are applied first.
+        See `restore_modified_assets`.
+        """
+        self.apply_deferred_changes()
+
+        result = dict(self._modified_resources)
+        for asset_id, resource in self.dirty_files.items():
+            result[asset_id] = RawResource(resource.resource_type(), resource.build())
+        return result
+
+    def restore_modified_assets(self, assets: dict[AssetId, RawResource]) -> None:
+        """Replaces the given assets with the results of `encode_modified_assets`."""
+        for asset_id, asset in assets.items():
+            self.memory_files.pop(asset_id)
+            self.replace_asset(asset_id, asset)
+
+    def discard_modifications(self) -> None:
+        """Makes all assets be as they're in the ISO again, including discarding deferred changes."""
+        for asset_id in [*self._modified_resources, *self.dirty_files]:
+            self._clear_cached_dependencies_for_asset(asset_id)
+
+        self._modified_resources = {}
+        self._memory_files = {}
+        self._type_index = None
+        self.memory_files.clear()
+        self.dirty_files = {}
+        self.deferred_changes = {}
+
+    def mark_dirty(self, path: NameOrAssetId) -> None:
+        """Flags the given asset as modified, so it's encoded when flushing. Must have been obtained via `get_file`."""
+        asset_id = self.resolve_asset_id(path)
+        if asset_id not in self.dirty_files:
+            resource = self.memory_files.pop(asset_id)
+            if resource is None:
+                raise ValueError(f"Asset {asset_id} was marked as dirty, but isn't in memory")
+            self.dirty_files[asset_id] = resource
+
+    def is_dirty(self, path: NameOrAssetId) -> bool:
+        asset_id = self.resolve_asset_id(path)
+        return asset_id in self.dirty_files or asset_id in self.deferred_changes
+
+    def defer_change(self, path: NameOrAssetId, change: Callable[[], None]) -> None:
+        """
+        Calls `change` only once the asset is requested via `get_file`, right before returning it.
+        Changes for the same asset are called in the order they were deferred.
+        """
+        self.deferred_changes.setdefault(self.resolve_asset_id(path), []).append(change)
+
+    def apply_deferred_changes(self, path: NameOrAssetId | None = None) -> None:
+        """Applies the deferred changes of the given asset now, or of all assets when None."""
+        if path is None:
+            asset_ids = list(self.deferred_changes.keys())
+        else:
+            asset_ids = [self.resolve_asset_id(path)]
+
+        for asset_id in asset_ids:
+            # Removed before calling, as the changes themselves use get_file for the asset
+            for change in self.deferred_changes.pop(asset_id, []):
+                change()
+
+    def _parse_asset(self, asset_id: AssetId, type_hint: type[T]) -> tuple[T, int]:
+        """Parses the asset, also returning its decompressed size."""
+        cache = self.parsed_cache
+        # The disk cache only knows about the assets as they're in the ISO
+        if asset_id in self._modified_resources or self.get_asset_type(asset_id) not in CACHED_ASSET_TYPES:
+            cache = None
+
+        if cache is not None and (cached := cache.load(asset_id, self)) is not None:
+            return typing.cast("tuple[T, int]", cached)
+
+        data = self.get_decompressed_asset(asset_id)
+        resource = self._parse_decompressed(asset_id, data, type_hint)
+        if cache is not None:
+            cache.store(asset_id, resource, len(data))
+        return resource, len(data)
 
     def get_file(self, path: NameOrAssetId, type_hint: type[T] = BaseResource) -> T:
-        if path not in self.memory_files:
-            self.memory_files[path] = self.get_parsed_asset(path, type_hint=type_hint)
-        return self.memory_files[path]
+        asset_id = self.resolve_asset_id(path)
+        if asset_id in self.deferred_changes:
+            self.apply_deferred_changes(asset_id)
+
+        if asset_id in self.dirty_files:
+            return self.dirty_files[asset_id]
+
+        resource = self.memory_files.get(asset_id)
+        if resource is None:
+            resource, size = self._parse_asset(asset_id, type_hint)
+            self.memory_files.put(asset_id, resource, size)
+        return resource
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import bisect
+import functools
+import itertools
+import json
+import mmap
+import struct
+import typing
+from array import array
+from pathlib import Path
+
+from pwime.util.cache_dir import get_cache_path, write_atomically
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Buffer
+
+    from retro_data_structures.base_resource import AssetId
+    from retro_data_structures.game_check import Game
+
+_MAGIC = b"PWAN"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIQ")
+
+
+def compile_asset_names(name_to_id: dict[str, AssetId]) -> bytes:
+    """
+    Encodes the names into the format read by AssetNameIndex:
+    - header: magic, version, count
+    - ids: count uint64, sorted
+    - offsets: count + 1 uint32, where the name of the nth id starts in the names blob
+    - name_order: count uint32, indices of the ids sorted by their name
+    - names: all names encoded as utf-8, concatenated
+    Arrays are in native byte order, as the compiled file is only meant for the machine that created it.
+    """
+    by_id = sorted({asset_id: name.encode() for name, asset_id in name_to_id.items()}.items())
+    names = [name for _, name in by_id]
+
+    ids = array("Q", (asset_id for asset_id, _ in by_id))
+    offsets = array("I", itertools.accumulate(map(len, names), initial=0))
+    name_order = array("I", sorted(range(len(names)), key=names.__getitem__))
+
+    return b"".join(
+        [
+            _HEADER.pack(_MAGIC, _VERSION, len(ids)),
+            ids.tobytes(),
+            offsets.tobytes(),
+            name_order.tobytes(),
+            *names,
+        ]
+    )
+
+
+class AssetNameIndex:
+    """Read-only mapping of asset id to name, backed by the output of `compile_asset_names`."""
+
+    def __init__(self, data: Buffer):
+        view = memoryview(data)
+        magic, version, count = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a compiled asset name index")
+
+        start = _HEADER.size
+        self._ids = view[start : start + 8 * count].cast("Q")
+        start += 8 * count
+        self._offsets = view[start : start + 4 * (count + 1)].cast("I")
+        start += 4 * (count + 1)
+        self._name_order = view[start : start + 4 * count].cast("I")
+        start += 4 * count
+        self._names = view[start:]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, asset_id: AssetId) -> bool:
+        return self._index_of(asset_id) is not None
+
+    def __getitem__(self, asset_id: AssetId) -> str:
+        name = self.get(asset_id)
+        if name is None:
+            raise KeyError(asset_id)
+        return name
+
+    def _encoded_name_at(self, index: int) -> bytes:
+        return bytes(self._names[self._offsets[index] : self._offsets[index + 1]])
+
+    def _index_of(self, asset_id: AssetId) -> int | None:
+        index = bisect.bisect_left(self._ids, asset_id)
+        if index < len(self._ids) and self._ids[index] == asset_id:
+            return index
+        return None
+
+    def get[D](self, asset_id: AssetId, default: D = None) -> str | D:
+        """Gets the name of the given asset id, or default if it has no known name."""
+        index = self._index_of(asset_id)
+        if index is None:
+            return default
+        return self._encoded_name_at(index).decode()
+
+    def find_id(self, name: str) -> AssetId | None:
+        """Gets the asset id with the given name, or None if no asset has it."""
+        encoded = name.encode()
+        position = bisect.bisect_left(self._name_order, encoded, key=self._encoded_name_at)
+        if position < len(self._name_order):
+            index = self._name_order[position]
+            if self._encoded_name_at(index) == encoded:
+                return self._ids[index]
+        return None
+
+
+@functools.cache
+def get_asset_names(game: Game) -> AssetNameIndex:
+    """
+    The known asset names for the given game, shared by the whole process.
+    On first use, the names are compiled into the user cache, then it's memory-mapped from there.
+    """
+    source = Path(__file__).parent.joinpath("asset_names", f"{game.name}.json")
+    try:
+        stat = source.stat()
+    except FileNotFoundError:
+        return AssetNameIndex(compile_asset_names({}))
+
+    compiled = get_cache_path("asset_names", f"{game.name}-{stat.st_size}-{stat.st_mtime_ns}-v{_VERSION}.bin")
+    if not compiled.is_file():
+        with source.open() as f:
+            data = compile_asset_names(json.load(f))
+        try:
+            write_atomically(compiled, data)
+        except OSError:
+            return AssetNameIndex(data)
+
+    with compiled.open("rb") as f:
+        return AssetNameIndex(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import multiprocessing
+import sys
+import typing
+
+from pwime.asset_manager import OurAssetManager
+from pwime.file_provider import open_game
+from pwime.project import ProjectFile
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+    from pathlib import Path
+
+    from retro_data_structures.base_resource import AssetId
+    from retro_data_structures.game_check import Game
+
+_base_manager: OurAssetManager | None = None
+
+
+def used_assets(projects: Iterable[Path]) -> list[AssetId]:
+    """All assets used by the operations of the given projects. Projects that can't be read are skipped."""
+    result: set[AssetId] = set()
+    for path in projects:
+        try:
+            project_file = ProjectFile.read(path)
+        except (OSError, ValueError, KeyError):
+            continue
+        for performed in project_file.operations:
+            result.update(performed.operation.used_assets())
+    return sorted(result)
+
+
+def _create_base_manager(base_iso: Path, game: Game, memory_map: bool) -> OurAssetManager:
+    # Nothing is discarded, so everything loaded before forking stays shared
+    return OurAssetManager(open_game(base_iso, memory_map=memory_map), game, memory_budget=sys.maxsize)
+
+
+def _initialize_worker(base_iso: Path, game: Game, memory_map: bool) -> None:
+    global _base_manager  # noqa: PLW0603
+    _base_manager = _create_base_manager(base_iso, game, memory_map)
+
+
+def base_manager() -> OurAssetManager:
+    """The manager for the base game, in a task of `map_with_base_manager`. Only that task uses it."""
+    assert _base_manager is not None
+    return _base_manager
+
+
+def map_with_base_manager[T, R](
+    function: Callable[[T], R],
+    tasks: Iterable[T],
+    jobs: int | None,
+    base_iso: Path,
+    game: Game,
+    *,
+    memory_map: bool = False,
+    preload: Iterable[AssetId] = (),
+) -> Iterator[R]:
+    """
+    Calls `function` with each task across `jobs` processes, yielding the results as they finish.
+    Each task runs in a process of its own, where `base_manager` has no modifications.
+    Where processes can be forked, the manager is created and the `preload` assets are parsed only once, before
+    forking, so all tasks share them instead of reading and parsing them again.
+    Tasks can't start processes of their own.
+    """
+    global _base_manager  # noqa: PLW0603
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        _base_manager = _create_base_manager(base_iso, game, memory_map)
+        for asset_id in preload:
+            if _base_manager.does_asset_exists(asset_id):
+                _base_manager.get_file(asset_id)
+        initializer, initargs = None, ()
+    else:
+        context = multiprocessing.get_context()
+        initializer, initargs = _initialize_worker, (base_iso, game, memory_map)
+
+    try:
+        # A new process for each task, so none sees what the others modified
+        with context.Pool(jobs, initializer, initargs, maxtasksperchild=1) as pool:
+            yield from pool.imap_unordered(function, tasks)
+    finally:
+        _base_manager = None
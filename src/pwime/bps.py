@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import struct
+import typing
+import zlib
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Sequence
+    from pathlib import Path
+
+_MAGIC = b"BPS1"
+_FOOTER = struct.Struct("<III")
+_CHUNK = 8 * 1024 * 1024
+
+_SOURCE_READ = 0
+_TARGET_READ = 1
+_SOURCE_COPY = 2
+_TARGET_COPY = 3
+
+
+class InvalidPatchError(Exception):
+    """The patch is malformed, or is for a different file."""
+
+
+def _encode_number(value: int) -> bytes:
+    assert value >= 0
+    result = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value == 0:
+            result.append(0x80 | byte)
+            return bytes(result)
+        result.append(byte)
+        value -= 1
+
+
+class _PatchReader:
+    def __init__(self, data: memoryview):
+        self.data = data
+        self.position = 0
+
+    def number(self) -> int:
+        result, shift = 0, 1
+        while True:
+            if self.position >= len(self.data):
+                raise InvalidPatchError("Patch ended unexpectedly")
+
+            byte = self.data[self.position]
+            self.position += 1
+            result += (byte & 0x7F) * shift
+            if byte & 0x80:
+                return result
+            shift <<= 7
+            result += shift
+
+    def signed_number(self) -> int:
+        value = self.number()
+        return -(value >> 1) if value & 1 else value >> 1
+
+    def read(self, size: int) -> memoryview:
+        if self.position + size > len(self.data):
+            raise InvalidPatchError("Patch ended unexpectedly")
+
+        result = self.data[self.position : self.position + size]
+        self.position += size
+        return result
+
+
+def file_crc32(path: Path) -> int:
+    crc = 0
+    with path.open("rb") as file:
+        while chunk := file.read(_CHUNK):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def create_patch(source: Path, output: Path, target_size: int, changes: Sequence[tuple[int, bytes | Path]]) -> None:
+    """
+    Writes a BPS patch into `output`, that turns `source` into the same file with the given changes.
+    Everything outside the changes is the same as in `source`, or zeros past its end.
+    :param changes: Offset and data of each change, or the file with the data. They must not overlap.
+    """
+    source_size = source.stat().st_size
+    patch = bytearray(_MAGIC)
+    patch += _encode_number(source_size)
+    patch += _encode_number(target_size)
+    patch += _encode_number(0)
+
+    target_crc = 0
+    position = 0
+
+    with source.open("rb") as source_file:
+
+        def add_changed(data: bytes) -> None:
+            nonlocal position, target_crc
+            # Actions can't be empty
+            if not data:
+                return
+            patch.extend(_encode_number((len(data) - 1) << 2 | _TARGET_READ))
+            patch.extend(data)
+            target_crc = zlib.crc32(data, target_crc)
+            position += len(data)
+
+        def add_unchanged(end: int) -> None:
+            nonlocal position, target_crc
+            # Source reads can't go past the end of the source, so the rest is included as data
+            from_source = max(0, min(end, source_size) - position)
+            if from_source:
+                patch.extend(_encode_number((from_source - 1) << 2 | _SOURCE_READ))
+                source_file.seek(position)
+                remaining = from_source
+                while remaining and (chunk := source_file.read(min(remaining, _CHUNK))):
+                    target_crc = zlib.crc32(chunk, target_crc)
+                    remaining -= len(chunk)
+                position += from_source
+
+            if end > position:
+                add_changed(bytes(end - position))
+
+        for offset, data in sorted(changes, key=lambda change: change[0]):
+            if offset < position:
+                raise ValueError(f"Change at {offset} overlaps the previous one")
+
+            add_unchanged(offset)
+            add_changed(data if isinstance(data, bytes) else data.read_bytes())
+
+        add_unchanged(target_size)
+
+    patch += struct.pack("<II", file_crc32(source), target_crc)
+    patch += struct.pack("<I", zlib.crc32(patch))
+    output.write_bytes(patch)
+
+
+class _PatchApplier:
+    """Writes the target of a patch, by performing its actions in order."""
+
+    def __init__(self, source: typing.BinaryIO, target: typing.BinaryIO, reader: _PatchReader):
+        self._source = source
+        self._target = target
+        self._reader = reader
+        self.crc = 0
+        self.position = 0
+        self._source_offset = 0
+        self._target_offset = 0
+
+    def _write(self, chunk: bytes | memoryview) -> None:
+        self._target.seek(self.position)
+        self._target.write(chunk)
+        self.position += len(chunk)
+        self.crc = zlib.crc32(chunk, self.crc)
+
+    def _copy_from_source(self, offset: int, length: int) -> None:
+        self._source.seek(offset)
+        while length > 0:
+            chunk = self._source.read(min(length, _CHUNK))
+            if not chunk:
+                raise InvalidPatchError("The patch reads past the end of the source")
+            self._write(chunk)
+            length -= len(chunk)
+
+    def _copy_from_target(self, length: int) -> None:
+        while length > 0:
+            # The copy may overlap what it writes, repeating the data
+            size = min(length, self.position - self._target_offset, _CHUNK)
+            if size <= 0 or self._target_offset < 0:
+                raise InvalidPatchError("The patch copies from outside of the target")
+            self._target.seek(self._target_offset)
+            self._write(self._target.read(size))
+            self._target_offset += size
+            length -= size
+
+    def perform_next(self) -> None:
+        action = self._reader.number()
+        command, length = action & 3, (action >> 2) + 1
+
+        if command == _SOURCE_READ:
+            self._copy_from_source(self.position, length)
+
+        elif command == _TARGET_READ:
+            self._write(self._reader.read(length))
+
+        elif command == _SOURCE_COPY:
+            self._source_offset += self._reader.signed_number()
+            if self._source_offset < 0:
+                raise InvalidPatchError("The patch copies from outside of the source")
+            self._copy_from_source(self._source_offset, length)
+            self._source_offset += length
+
+        else:
+            self._target_offset += self._reader.signed_number()
+            self._copy_from_target(length)
+
+
+def apply_patch(source: Path, patch: Path, output: Path) -> None:
+    """
+    Writes into `output` the result of applying the BPS patch to `source`.
+    :raise InvalidPatchError: If the patch is malformed, is for another file, or the result isn't what was expected.
+    """
+    data = memoryview(patch.read_bytes())
+    if len(data) < len(_MAGIC) + _FOOTER.size or bytes(data[: len(_MAGIC)]) != _MAGIC:
+        raise InvalidPatchError("Not a BPS patch")
+
+    source_crc, target_crc, patch_crc = _FOOTER.unpack_from(data, len(data) - _FOOTER.size)
+    if zlib.crc32(data[:-4]) != patch_crc:
+        raise InvalidPatchError("The patch is corrupted")
+
+    reader = _PatchReader(data[: len(data) - _FOOTER.size])
+    reader.read(len(_MAGIC))
+    source_size = reader.number()
+    target_size = reader.number()
+    reader.read(reader.number())
+
+    if source.stat().st_size != source_size or file_crc32(source) != source_crc:
+        raise InvalidPatchError(f"The patch isn't for {source}")
+
+    with source.open("rb") as source_file, output.open("w+b") as result:
+        applier = _PatchApplier(source_file, result, reader)
+        while reader.position < len(reader.data):
+            applier.perform_next()
+
+    if applier.position != target_size or applier.crc != target_crc:
+        output.unlink()
+        raise InvalidPatchError("The patched file isn't what the patch expected")
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import dataclasses
+import io
+import json
+import typing
+import zipfile
+
+from retro_data_structures.base_resource import RawResource
+
+from pwime.util.cache_dir import write_atomically
+
+if typing.TYPE_CHECKING:
+    from pathlib import Path
+
+    from retro_data_structures.base_resource import AssetId
+
+_SCHEMA_VERSION = 2
+_METADATA_NAME = "checkpoint.json"
+
+
+def checkpoint_path(project_path: Path) -> Path:
+    """Where the checkpoint of the given project file is stored."""
+    return project_path.with_name(f"{project_path.name}.checkpoint")
+
+
+@dataclasses.dataclass(frozen=True)
+class ProjectCheckpoint:
+    """
+    The encoded contents of every asset modified by the first `operation_count` operations of a project.
+    Restoring it gives the same assets as performing these operations again, as long as the operations, the ISO and
+    the versions of pwime and retro-data-structures that encoded the assets are all still the same.
+    """
+
+    operation_count: int
+    operations_hash: str
+    iso_key: str
+    pwime_version: str
+    retro_data_structures_version: str
+    assets: dict[AssetId, RawResource]
+
+    def write(self, path: Path) -> None:
+        metadata = {
+            "schema_version": _SCHEMA_VERSION,
+            "operation_count": self.operation_count,
+            "operations_hash": self.operations_hash,
+            "iso_key": self.iso_key,
+            "pwime_version": self.pwime_version,
+            "retro_data_structures_version": self.retro_data_structures_version,
+            "assets": {f"{asset_id:08x}": asset.type for asset_id, asset in sorted(self.assets.items())},
+        }
+
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, "w") as archive:
+            archive.writestr(_METADATA_NAME, json.dumps(metadata))
+            for asset_id, asset in self.assets.items():
+                archive.writestr(f"{asset_id:08x}", asset.data)
+
+        write_atomically(path, data.getvalue())
+
+    @classmethod
+    def read(cls, path: Path) -> typing.Self | None:
+        """Reads the checkpoint at the path, or None if there's no valid one."""
+        try:
+            with zipfile.ZipFile(path) as archive:
+                metadata = json.loads(archive.read(_METADATA_NAME))
+                if metadata["schema_version"] != _SCHEMA_VERSION:
+                    return None
+
+                return cls(
+                    operation_count=metadata["operation_count"],
+                    operations_hash=metadata["operations_hash"],
+                    iso_key=metadata["iso_key"],
+                    pwime_version=metadata["pwime_version"],
+                    retro_data_structures_version=metadata["retro_data_structures_version"],
+                    assets={
+                        int(asset_id, 16): RawResource(asset_type, archive.read(asset_id))
+                        for asset_id, asset_type in metadata["assets"].items()
+                    },
+                )
+        except (OSError, zipfile.BadZipFile, ValueError, KeyError):
+            return None
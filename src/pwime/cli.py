@@ -40,18 +40,193 @@ def add_diff_parser(parser: argparse.ArgumentParser):
     parser.add_argument(
         "--base-iso",
         type=Path,
-        required=True,
-        help="The reference image, usually the original game.",
+        help="The reference image or extracted game, usually the original game.",
     )
     parser.add_argument(
         "--target-iso",
         type=Path,
-        required=True,
-        help="The image to diff, usually the modded game.",
+        help="The image or extracted game to diff, usually the modded game.",
+    )
+    parser.add_argument(
+        "--base-manifest",
+        type=Path,
+        help="A manifest written with --manifest-out, used instead of hashing the base ISO.",
+    )
+    parser.add_argument(
+        "--target-manifest",
+        type=Path,
+        help="A manifest written with --manifest-out, used instead of hashing the target ISO.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="How many processes to use for hashing assets, when an ISO isn't in the manifest cache.",
+    )
+    parser.add_argument(
+        "--memory-map",
+        action="store_true",
+        help="Memory-map the ISOs instead of reading them, which is faster when they're already in the page cache.",
+    )
+    parser.add_argument(
+        "--manifest-out",
+        type=Path,
+        help="Also write the manifest of the target ISO to this path, for --base-manifest or --target-manifest.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Where to save a project (.pwimep) that transforms the base image into the target image."
+        " Requires both ISOs, even when using manifests.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "jsonl"],
+        default="text",
+        help="How to report each different asset. jsonl includes the sizes and hashes of both versions.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Report differences as soon as they're found, instead of sorted by asset id.",
     )
 
+    def check_arguments(args: argparse.Namespace) -> None:
+        if args.base_iso is None and args.base_manifest is None:
+            parser.error("one of the arguments --base-iso --base-manifest is required")
+        if args.target_iso is None and args.target_manifest is None:
+            parser.error("one of the arguments --target-iso --target-manifest is required")
+        if args.output is not None and (args.base_iso is None or args.target_iso is None):
+            parser.error("argument --output: requires both --base-iso and --target-iso")
+
     from pwime.diff import run_cli
 
+    parser.set_defaults(func=run_cli, check_arguments=check_arguments)
+
+
+def add_compact_parser(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "project",
+        type=Path,
+        help="The project (.pwimep) to compact.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Where to save the compacted project. Defaults to overwriting the given project.",
+    )
+
+    from pwime.compact import run_cli  # noqa: PLC0415
+
+    parser.set_defaults(func=run_cli)
+
+
+def add_apply_parser(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "base_iso",
+        type=Path,
+        help="The ISO the patch was made for, usually the original game.",
+    )
+    parser.add_argument(
+        "patch",
+        type=Path,
+        help="The patch (.bps) to apply, such as one exported from a project.",
+    )
+    parser.add_argument(
+        "output",
+        type=Path,
+        help="Where to write the patched ISO.",
+    )
+
+    from pwime.apply import run_cli  # noqa: PLC0415
+
+    parser.set_defaults(func=run_cli)
+
+
+def add_export_parser(parser: argparse.ArgumentParser):
+    add_game_argument(parser)
+    parser.add_argument(
+        "--base-iso",
+        type=Path,
+        required=True,
+        help="The image or extracted game the projects modify, usually the original game.",
+    )
+    parser.add_argument(
+        "projects",
+        type=Path,
+        nargs="+",
+        help="The projects (.pwimep) to export.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        required=True,
+        help="Where to export the projects, each named after its project file.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["iso", "bps", "directory"],
+        default="iso",
+        help="Export each project as an image, a patch for the base image or an extracted game.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="How many projects to export at the same time. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--memory-map",
+        action="store_true",
+        help="Memory-map the ISO instead of reading it, which is faster when it's already in the page cache.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="When exporting images again, only write the files that changed since the last export.",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Keep the exported results, so exporting the same again only links to them.",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Remove the results kept with --cache before exporting.",
+    )
+
+    from pwime.export import run_cli  # noqa: PLC0415
+
+    parser.set_defaults(func=run_cli)
+
+
+def add_verify_parser(parser: argparse.ArgumentParser):
+    add_game_argument(parser)
+    parser.add_argument(
+        "--base-iso",
+        type=Path,
+        required=True,
+        help="The image or extracted game the projects modify, usually the original game.",
+    )
+    parser.add_argument(
+        "projects",
+        type=Path,
+        nargs="+",
+        help="The projects (.pwimep) to check.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="How many projects to check at the same time. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--memory-map",
+        action="store_true",
+        help="Memory-map the ISO instead of reading it, which is faster when it's already in the page cache.",
+    )
+
+    from pwime.verify import run_cli  # noqa: PLC0415
+
     parser.set_defaults(func=run_cli)
 
 
@@ -61,6 +236,14 @@ def create_parser() -> argparse.ArgumentParser:
     subparsers = parser.add_subparsers(dest="tool", required=True)
     add_gui_parser(subparsers.add_parser("gui", help="Run the GUI"))
     add_diff_parser(subparsers.add_parser("diff", help="Create a project with the difference between two ISOs"))
+    add_compact_parser(
+        subparsers.add_parser("compact", help="Merge the operations of a project into the fewest with the same result")
+    )
+    add_apply_parser(subparsers.add_parser("apply", help="Create an ISO by applying a BPS patch to the base ISO"))
+    add_export_parser(subparsers.add_parser("export", help="Export many projects at the same time, without the GUI"))
+    add_verify_parser(
+        subparsers.add_parser("verify", help="Check that projects still apply to an ISO, without exporting them")
+    )
 
     return parser
 
@@ -71,4 +254,7 @@ def run_cli(argv: list[str]) -> None:
         argv = ["gui"]
 
     args = create_parser().parse_args(argv)
+    # Combinations of arguments that argparse can't check by itself
+    if hasattr(args, "check_arguments"):
+        args.check_arguments(args)
     args.func(args)
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from pwime.project import ProjectFile, compact_operations
+
+if TYPE_CHECKING:
+    import argparse
+    from pathlib import Path
+
+
+def run_cli(args: argparse.Namespace) -> None:
+    project_path: Path = args.project
+    output: Path = args.output if args.output is not None else project_path
+
+    project_file = ProjectFile.read(project_path)
+    original_count = len(project_file.operations)
+    project_file.operations = compact_operations(project_file.operations)
+    project_file.write(output)
+
+    print(f"Compacted {original_count} operations into {len(project_file.operations)}.")
@@ -1,36 +1,320 @@
-import argparse
+from __future__ import annotations
+
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import TYPE_CHECKING
 
 import tqdm
-from retro_data_structures.file_provider import IsoFileProvider
-from retro_data_structures.game_check import Game
+from retro_data_structures.formats import Mlvl, Strg
 
 from pwime.asset_manager import OurAssetManager
+from pwime.file_provider import open_game
+from pwime.gui.editor.strg_window import StrgEditOperation
+from pwime.manifest import AssetManifest, IsoIdentity, hash_assets, read_cached_manifest, write_cached_manifest
+from pwime.operations.script_instance import InstanceReference, ScriptInstancePropertyEdit, create_delta_between
+from pwime.project import Project
 
 if TYPE_CHECKING:
+    import argparse
+    import typing
+    from collections.abc import Callable, Mapping
     from pathlib import Path
 
-    from retro_data_structures.base_resource import (
-        AssetId,
-        RawResource,
-    )
+    from retro_data_structures.base_resource import AssetId
+    from retro_data_structures.game_check import Game
+
+    from pwime.manifest import ManifestEntry
+
+
+_worker_manager: OurAssetManager | None = None
+_worker_reference: Mapping[AssetId, ManifestEntry] | None = None
+
+
+def _initialize_worker(
+    iso: Path, game: Game, memory_map: bool, reference: Mapping[AssetId, ManifestEntry] | None
+) -> None:
+    global _worker_manager, _worker_reference  # noqa: PLW0603
+    _worker_manager = OurAssetManager(open_game(iso, memory_map=memory_map), game)
+    _worker_reference = reference
+
+
+def _hash_shard_with(
+    manager: OurAssetManager,
+    asset_ids: list[AssetId],
+    reference: Mapping[AssetId, ManifestEntry] | None,
+) -> dict[AssetId, ManifestEntry]:
+    result = hash_assets(manager, asset_ids, reference)
+    # A shard covers a single pak, so there's no point keeping it around for the next one.
+    manager.pak_group.release_in_memory_paks()
+    return result
+
+
+def _hash_shard(asset_ids: list[AssetId]) -> dict[AssetId, ManifestEntry]:
+    assert _worker_manager is not None
+    return _hash_shard_with(_worker_manager, asset_ids, _worker_reference)
+
+
+def build_manifest(
+    iso: Path,
+    game: Game,
+    jobs: int,
+    *,
+    on_entries: Callable[[dict[AssetId, ManifestEntry]], None] | None = None,
+    reference: AssetManifest | None = None,
+    memory_map: bool = False,
+) -> AssetManifest:
+    """
+    Gets the manifest for the given ISO, from the cache if possible.
+    Otherwise, the assets are hashed across `jobs` processes, each with their own asset manager.
+    :param on_entries: Called with the entries as soon as they're available, either all at once or one pak at a time.
+    :param reference: A manifest of a similar ISO. Assets stored exactly the same way aren't decompressed again.
+    :param memory_map: If the ISO is memory-mapped instead of read, see `ConcurrentIsoFileProvider`.
+    """
+    identity = IsoIdentity.from_path(iso)
+    manifest = read_cached_manifest(identity)
+    if manifest is not None:
+        if on_entries is not None:
+            on_entries(manifest.entries)
+        return manifest
+
+    manager = OurAssetManager(open_game(iso, memory_map=memory_map), game)
+    shards = manager.asset_ids_by_pak(manager.all_asset_ids())
+    reference_entries = reference.entries if reference is not None else None
+    entries: dict[AssetId, ManifestEntry] = {}
+
+    with tqdm.tqdm(total=sum(len(shard) for shard in shards), desc=iso.name) as progress:
+        if jobs <= 1:
+            for shard in shards:
+                shard_entries = _hash_shard_with(manager, shard, reference_entries)
+                if on_entries is not None:
+                    on_entries(shard_entries)
+                entries.update(shard_entries)
+                progress.update(len(shard))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=_initialize_worker,
+                initargs=(iso, game, memory_map, reference_entries),
+            ) as executor:
+                futures = {executor.submit(_hash_shard, shard): len(shard) for shard in shards}
+                for future in as_completed(futures):
+                    shard_entries = future.result()
+                    if on_entries is not None:
+                        on_entries(shard_entries)
+                    entries.update(shard_entries)
+                    progress.update(futures[future])
+
+    manifest = AssetManifest(identity, entries)
+    write_cached_manifest(manifest)
+    return manifest
+
+
+def _read_or_build_manifest(
+    manifest_path: Path | None,
+    iso: Path | None,
+    game: Game,
+    jobs: int,
+    *,
+    on_entries: Callable[[dict[AssetId, ManifestEntry]], None] | None = None,
+    reference: AssetManifest | None = None,
+    memory_map: bool = False,
+) -> AssetManifest:
+    """Reads the manifest from `manifest_path` when given, otherwise it's the same as `build_manifest` for `iso`."""
+    if manifest_path is None:
+        assert iso is not None
+        return build_manifest(iso, game, jobs, on_entries=on_entries, reference=reference, memory_map=memory_map)
+
+    manifest = AssetManifest.read_from_path(manifest_path)
+    if on_entries is not None:
+        on_entries(manifest.entries)
+    return manifest
+
+
+class DiffReporter:
+    """Writes each difference to the output as soon as it's reported."""
+
+    def __init__(self, output: typing.TextIO):
+        self.output = output
+
+    def report(self, asset_id: AssetId, base: ManifestEntry, target: ManifestEntry | None) -> None:
+        raise NotImplementedError
+
+
+class TextDiffReporter(DiffReporter):
+    def report(self, asset_id: AssetId, base: ManifestEntry, target: ManifestEntry | None) -> None:
+        if target is None:
+            print(f"Missing asset: {asset_id:08x} ({base.type})", file=self.output, flush=True)
+        else:
+            print(f"Different asset: {asset_id:08x} ({base.type})", file=self.output, flush=True)
+
+
+class JsonLinesDiffReporter(DiffReporter):
+    def report(self, asset_id: AssetId, base: ManifestEntry, target: ManifestEntry | None) -> None:
+        record = {
+            "asset_id": f"0x{asset_id:08x}",
+            "type": base.type,
+            "base_size": base.size,
+            "base_hash": base.hash,
+            "target_size": target.size if target is not None else None,
+            "target_hash": target.hash if target is not None else None,
+        }
+        self.output.write(json.dumps(record) + "\n")
+        self.output.flush()
+
+
+DIFF_REPORTERS: dict[str, type[DiffReporter]] = {
+    "text": TextDiffReporter,
+    "jsonl": JsonLinesDiffReporter,
+}
+
+
+def _report_unsupported(asset_type: str, asset_id: AssetId, message: str) -> None:
+    # Not on stdout, where the differences are reported
+    print(f"Unable to represent difference in {asset_type} {asset_id:08x}: {message}", file=sys.stderr)
+
+
+def _add_mrea_operations(project: Project, target_manager: OurAssetManager, mrea_id: AssetId) -> None:
+    base_manager = project.asset_manager
+    mlvl_id = base_manager.find_mlvl_for_mrea(mrea_id)
+    base_area = base_manager.get_file(mlvl_id, Mlvl).get_area(mrea_id)
+    target_area = target_manager.get_file(mlvl_id, Mlvl).get_area(mrea_id)
+
+    base_instances = {instance.id: instance for instance in base_area.all_instances}
+    target_instances = {instance.id: instance for instance in target_area.all_instances}
+
+    for instance_id in sorted(base_instances.keys() - target_instances.keys()):
+        _report_unsupported("MREA", mrea_id, f"instance {instance_id} was removed")
+
+    for instance_id in sorted(target_instances.keys() - base_instances.keys()):
+        _report_unsupported("MREA", mrea_id, f"instance {instance_id} was added")
+
+    for instance_id, target_instance in target_instances.items():
+        base_instance = base_instances.get(instance_id)
+        if base_instance is None:
+            continue
+
+        if base_instance.type_name != target_instance.type_name:
+            _report_unsupported("MREA", mrea_id, f"instance {instance_id} changed type")
+            continue
+
+        if base_instance.connections != target_instance.connections:
+            _report_unsupported("MREA", mrea_id, f"connections of instance {instance_id} changed")
+
+        # Only decode the properties of instances that actually changed
+        if base_instance.raw_properties == target_instance.raw_properties:
+            continue
+
+        delta = create_delta_between(base_instance.get_properties(), target_instance.get_properties())
+        if delta:
+            project.add_new_operation(
+                ScriptInstancePropertyEdit(
+                    InstanceReference(mlvl_id, mrea_id, instance_id),
+                    target_instance.script_type,
+                    delta,
+                )
+            )
+
+
+def _add_strg_operations(project: Project, target_manager: OurAssetManager, strg_id: AssetId) -> None:
+    base_strg = project.asset_manager.get_file(strg_id, Strg)
+    target_strg = target_manager.get_file(strg_id, Strg)
+
+    if base_strg.get_language_list() != target_strg.get_language_list():
+        _report_unsupported("STRG", strg_id, "list of languages changed")
+        return
+
+    for language in base_strg.get_language_list():
+        base_strings = base_strg.get_strings(language)
+        target_strings = target_strg.get_strings(language)
+        if len(base_strings) != len(target_strings):
+            _report_unsupported("STRG", strg_id, f"number of strings for {language} changed")
+            continue
+
+        for index, (base_text, target_text) in enumerate(zip(base_strings, target_strings)):
+            if base_text != target_text:
+                project.add_new_operation(
+                    StrgEditOperation(
+                        asset_id=strg_id,
+                        index=index,
+                        new_text=target_text,
+                        language=language,
+                    )
+                )
+
+
+def create_project_from_differences(
+    name: str,
+    base_manager: OurAssetManager,
+    target_manager: OurAssetManager,
+    different_ids: list[AssetId],
+) -> Project:
+    """
+    Creates a project with operations that transform the base assets into the target assets.
+    Only the given assets are parsed, and of these, only the script instances with different properties are decoded.
+    """
+    project = Project(name, base_manager)
+
+    for asset_id in tqdm.tqdm(different_ids, desc="Creating project"):
+        asset_type = base_manager.get_asset_type(asset_id)
+        match asset_type:
+            case "MREA":
+                _add_mrea_operations(project, target_manager, asset_id)
+            case "STRG":
+                _add_strg_operations(project, target_manager, asset_id)
+            case _:
+                _report_unsupported(asset_type, asset_id, "no operation supports this asset type")
+
+    return project
 
 
 def run_cli(args: argparse.Namespace) -> None:
-    base_iso: Path = args.base_iso
-    target_iso: Path = args.target_iso
+    base_iso: Path | None = args.base_iso
+    target_iso: Path | None = args.target_iso
+
+    reporter = DIFF_REPORTERS[args.format](sys.stdout)
+    different_ids: list[AssetId] = []
+
+    def report(asset_id: AssetId, target_entry: ManifestEntry | None) -> None:
+        different_ids.append(asset_id)
+        reporter.report(asset_id, base_manifest.entries[asset_id], target_entry)
 
-    base_manager = OurAssetManager(IsoFileProvider(base_iso), Game.ECHOES)
-    target_manager = OurAssetManager(IsoFileProvider(target_iso), Game.ECHOES)
+    def report_entries(entries: dict[AssetId, ManifestEntry]) -> None:
+        for asset_id in sorted(entries.keys() & base_manifest.entries.keys()):
+            if not base_manifest.entries[asset_id].has_same_contents(entries[asset_id]):
+                report(asset_id, entries[asset_id])
+
+    base_manifest = _read_or_build_manifest(
+        args.base_manifest, base_iso, args.game, args.jobs, memory_map=args.memory_map
+    )
+    target_manifest = _read_or_build_manifest(
+        args.target_manifest,
+        target_iso,
+        args.game,
+        args.jobs,
+        on_entries=report_entries if args.stream else None,
+        reference=base_manifest,
+        memory_map=args.memory_map,
+    )
 
-    different_ids: list[tuple[AssetId, RawResource, RawResource]] = []
+    if args.manifest_out is not None:
+        target_manifest.write_to_path(args.manifest_out)
 
-    all_ids = list(base_manager.all_asset_ids())
-    for asset_id in tqdm.tqdm(all_ids):
-        base_raw = base_manager.get_raw_asset(asset_id)
-        target_raw = target_manager.get_raw_asset(asset_id)
-        if base_raw != target_raw:
-            different_ids.append((asset_id, base_raw, target_raw))
+    if args.stream:
+        for asset_id in sorted(base_manifest.entries.keys() - target_manifest.entries.keys()):
+            report(asset_id, None)
+        different_ids.sort()
+    else:
+        for asset_id in base_manifest.different_assets(target_manifest):
+            report(asset_id, target_manifest.entries.get(asset_id))
 
-    for asset_id, base_raw, target_raw in different_ids:
-        print(f"Different asset: {asset_id:08x} ({base_raw.type})")
+    if args.output is not None:
+        assert base_iso is not None and target_iso is not None
+        output: Path = args.output
+        project = create_project_from_differences(
+            output.stem,
+            OurAssetManager(open_game(base_iso, memory_map=args.memory_map), args.game),
+            OurAssetManager(open_game(target_iso, memory_map=args.memory_map), args.game),
+            different_ids,
+        )
+        project.save_to_file(output)
@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+import struct
+import typing
+
+from retro_data_structures.formats import dol
+
+from pwime import bps
+from pwime.manifest import IsoIdentity, content_hash
+from pwime.util.cache_dir import get_cache_path, write_atomically
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+    from pwime.util.json_lib import JsonObject
+
+type ProgressCallback = Callable[[float, str, int], None]
+"""Same arguments as the progress callback of nod: progress from 0 to 1, what is being written and bytes written."""
+
+GCN_DISC_SIZE = 1_459_978_240
+_ALIGNMENT = 0x8000
+_COPY_CHUNK = 8 * 1024 * 1024
+
+_GC_MAGIC = struct.Struct(">I")
+_GC_MAGIC_OFFSET = 0x1C
+_GC_MAGIC_WORD = 0xC2339F3D
+_HEADER_OFFSETS = struct.Struct(">III")
+"""Offsets of the DOL and FST, and size of the FST."""
+_HEADER_OFFSETS_POSITION = 0x420
+_APPLOADER_POSITION = 0x2440
+_APPLOADER_SIZES = struct.Struct(">II")
+_APPLOADER_HEADER_SIZE = 0x20
+_FST_ENTRY = struct.Struct(">III")
+_FST_FILE_LOCATION = struct.Struct(">II")
+_DOL_NAME = "sys/main.dol"
+_STATE_SCHEMA_VERSION = 1
+
+
+class UnsupportedPatchError(Exception):
+    """The modifications can't be written by patching the disc, so it must be built from scratch instead."""
+
+
+def _align(value: int) -> int:
+    return (value + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _fst_file_indices(fst: bytes) -> dict[str, int]:
+    """The FST entry of each file in the disc, by its path."""
+    count = _FST_ENTRY.unpack_from(fst, 0)[2]
+    names_start = count * _FST_ENTRY.size
+
+    result = {}
+    # The index after the last entry of each directory we're in, along with its path
+    directories = [(count, "")]
+    for i in range(1, count):
+        while i >= directories[-1][0]:
+            directories.pop()
+
+        kind_and_name, _, param = _FST_ENTRY.unpack_from(fst, i * _FST_ENTRY.size)
+        name_start = names_start + (kind_and_name & 0xFFFFFF)
+        path = directories[-1][1] + fst[name_start : fst.index(b"\0", name_start)].decode("ascii")
+        if kind_and_name >> 24:
+            directories.append((param, f"{path}/"))
+        else:
+            result[path] = i
+
+    return result
+
+
+class _SpaceAllocator:
+    """Finds space in the disc that isn't used by anything."""
+
+    def __init__(self, used: list[tuple[int, int]], disc_size: int):
+        self._gaps = []
+        position = 0
+        for start, end in sorted(used):
+            if start > position:
+                self._gaps.append((position, start))
+            position = max(position, end)
+        if disc_size > position:
+            self._gaps.append((position, disc_size))
+
+    def allocate(self, size: int) -> int:
+        for i, (start, end) in enumerate(self._gaps):
+            offset = _align(start)
+            if offset + size <= end:
+                self._gaps[i] = (offset + size, end)
+                return offset
+
+        raise UnsupportedPatchError(f"Not enough free space in the disc for {size} bytes")
+
+
+@dataclasses.dataclass(frozen=True)
+class _Replacement:
+    name: str
+    source: Path
+    offset: int
+    size: int
+
+
+@dataclasses.dataclass(frozen=True)
+class _PatchPlan:
+    header: bytes
+    fst: bytes
+    fst_offset: int
+    replacements: list[_Replacement]
+
+    def target_size(self, source_size: int) -> int:
+        return max(source_size, *(replacement.offset + replacement.size for replacement in self.replacements))
+
+    def changes(self) -> list[tuple[int, bytes | Path]]:
+        """Everything that is written over a copy of the base disc."""
+        return [
+            (0, self.header),
+            (self.fst_offset, self.fst),
+            *((replacement.offset, replacement.source) for replacement in self.replacements),
+        ]
+
+
+def _plan_patch(disc: typing.BinaryIO, game_root: Path) -> _PatchPlan:
+    disc.seek(0)
+    header = bytearray(disc.read(_APPLOADER_POSITION + _APPLOADER_HEADER_SIZE))
+    if _GC_MAGIC.unpack_from(header, _GC_MAGIC_OFFSET)[0] != _GC_MAGIC_WORD:
+        raise UnsupportedPatchError("Only GameCube discs can be patched")
+
+    dol_offset, fst_offset, fst_size = _HEADER_OFFSETS.unpack_from(header, _HEADER_OFFSETS_POSITION)
+    apploader_size, trailer_size = _APPLOADER_SIZES.unpack_from(header, _APPLOADER_POSITION + 0x14)
+
+    disc.seek(fst_offset)
+    fst = bytearray(disc.read(fst_size))
+    disc.seek(dol_offset)
+    dol_size = dol.calculate_size_from_header(dol.DolHeader.parse_stream(disc))
+
+    file_indices = _fst_file_indices(fst)
+    locations = {
+        name: _FST_FILE_LOCATION.unpack_from(fst, index * _FST_ENTRY.size + 4) for name, index in file_indices.items()
+    }
+    locations[_DOL_NAME] = (dol_offset, dol_size)
+
+    new_sizes: dict[str, tuple[Path, int]] = {}
+    files_root = game_root.joinpath("files")
+    for path in files_root.rglob("*"):
+        if path.is_file():
+            name = path.relative_to(files_root).as_posix()
+            if name not in file_indices:
+                raise UnsupportedPatchError(f"{name} isn't in the disc, and new files can't be added")
+            new_sizes[name] = (path, path.stat().st_size)
+
+    dol_path = game_root.joinpath(_DOL_NAME)
+    if dol_path.is_file():
+        new_sizes[_DOL_NAME] = (dol_path, dol_path.stat().st_size)
+
+    # Files that no longer fit where they were are moved to free space, including what the others left
+    moved = {name for name, (_, size) in new_sizes.items() if size > locations[name][1]}
+    used = [
+        (0, _APPLOADER_POSITION + _APPLOADER_HEADER_SIZE + apploader_size + trailer_size),
+        (fst_offset, fst_offset + fst_size),
+    ]
+    used.extend((offset, offset + size) for name, (offset, size) in locations.items() if name not in moved)
+    allocator = _SpaceAllocator(used, GCN_DISC_SIZE)
+
+    replacements = []
+    for name, (path, size) in sorted(new_sizes.items()):
+        offset = allocator.allocate(size) if name in moved else locations[name][0]
+        replacements.append(_Replacement(name, path, offset, size))
+
+        if name == _DOL_NAME:
+            _HEADER_OFFSETS.pack_into(header, _HEADER_OFFSETS_POSITION, offset, fst_offset, fst_size)
+        else:
+            _FST_FILE_LOCATION.pack_into(fst, file_indices[name] * _FST_ENTRY.size + 4, offset, size)
+
+    return _PatchPlan(bytes(header), bytes(fst), fst_offset, replacements)
+
+
+@dataclasses.dataclass(frozen=True)
+class PatchedFile:
+    """A file that was written into a patched disc."""
+
+    offset: int
+    size: int
+    hash: str
+
+
+@dataclasses.dataclass(frozen=True)
+class PatchedDiscState:
+    """
+    What was written into a patched disc, so the next patch of the same disc only writes what changed.
+    Only valid while both the base disc and the patched disc are exactly as they were.
+    """
+
+    base: IsoIdentity
+    output_size: int
+    output_mtime_ns: int
+    files: dict[str, PatchedFile]
+
+    def to_json(self) -> JsonObject:
+        return {
+            "schema_version": _STATE_SCHEMA_VERSION,
+            "base": self.base.to_json(),
+            "output_size": self.output_size,
+            "output_mtime_ns": self.output_mtime_ns,
+            "files": {name: dataclasses.asdict(file) for name, file in self.files.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: JsonObject) -> typing.Self:
+        if data["schema_version"] != _STATE_SCHEMA_VERSION:
+            raise ValueError(f"Unsupported patch state schema version: {data['schema_version']}")
+
+        return cls(
+            base=IsoIdentity.from_json(data["base"]),
+            output_size=data["output_size"],
+            output_mtime_ns=data["output_mtime_ns"],
+            files={name: PatchedFile(**file) for name, file in data["files"].items()},
+        )
+
+
+def _state_path(output: Path) -> Path:
+    return get_cache_path("patched_discs", f"{hashlib.sha1(os.fspath(output.resolve()).encode()).hexdigest()}.json")
+
+
+def _read_state(source: Path, output: Path) -> PatchedDiscState | None:
+    """The state of the last patch written to `output`, if it's still valid."""
+    try:
+        state = PatchedDiscState.from_json(json.loads(_state_path(output).read_text()))
+        stat = output.stat()
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    if (stat.st_size, stat.st_mtime_ns) != (state.output_size, state.output_mtime_ns):
+        return None
+    # Writing to it would also change the other files it's linked to
+    if stat.st_nlink != 1:
+        return None
+    if state.base != IsoIdentity.from_path(source):
+        return None
+    return state
+
+
+def patch_disc(
+    source: Path,
+    output: Path,
+    game_root: Path,
+    progress_callback: ProgressCallback,
+    *,
+    incremental: bool = False,
+) -> None:
+    """
+    Writes a copy of the GameCube disc at `source` into `output`, with the files in `game_root` replacing the ones in
+    the disc. `game_root` has the same layout as an extracted game, but only with the files that were modified.
+    Unmodified files are copied as they are, so nothing needs to be extracted.
+    Files that grew are moved to free space in the disc, with the FST updated to match.
+    With `incremental`, what was written is remembered. If `output` is still the result of the previous incremental
+    patch of the same disc, only the files that changed since then are written, instead of copying the whole disc.
+    :raise UnsupportedPatchError: If the disc isn't a GameCube disc, there are new files or there's no space left.
+    :raise ValueError: If `output` is `source`. Not an UnsupportedPatchError, as building the disc instead would also
+    replace `source`.
+    """
+    if output.exists() and output.samefile(source):
+        raise ValueError("Can't patch the disc being read")
+
+    previous = _read_state(source, output) if incremental else None
+    # Removed before writing anything, as the output won't match it anymore
+    _state_path(output).unlink(missing_ok=True)
+
+    with source.open("rb") as disc:
+        plan = _plan_patch(disc, game_root)
+        files = {
+            replacement.name: PatchedFile(
+                replacement.offset, replacement.size, content_hash(replacement.source.read_bytes())
+            )
+            for replacement in plan.replacements
+        }
+
+        source_size = source.stat().st_size
+        if previous is None:
+            # Everything from the base disc needs to be copied
+            restored = [(0, source_size)]
+            replacements = plan.replacements
+        else:
+            # What the previous patch wrote is restored from the base disc, unless it's exactly what's needed now.
+            # Either way, the result is the same as patching a copy of the base disc.
+            restored = [(file.offset, file.size) for name, file in previous.files.items() if files.get(name) != file]
+            replacements = [r for r in plan.replacements if previous.files.get(r.name) != files[r.name]]
+
+        total = sum(size for _, size in restored) + sum(replacement.size for replacement in replacements)
+        written = 0
+
+        if previous is None:
+            # Replaced instead of written to, in case it's a link to another file
+            output.unlink(missing_ok=True)
+
+        with output.open("r+b" if previous is not None else "wb") as result:
+            for offset, size in restored:
+                disc.seek(offset)
+                result.seek(offset)
+                remaining = size
+                while remaining > 0 and (chunk := disc.read(min(remaining, _COPY_CHUNK))):
+                    result.write(chunk)
+                    remaining -= len(chunk)
+                    written += len(chunk)
+                    progress_callback(written / total, source.name, written)
+
+            for replacement in replacements:
+                result.seek(replacement.offset)
+                result.write(replacement.source.read_bytes())
+                written += replacement.size
+                progress_callback(written / total, replacement.name, written)
+
+            result.seek(0)
+            result.write(plan.header)
+            result.seek(plan.fst_offset)
+            result.write(plan.fst)
+            # Previous patches may have written past the end of what's needed now
+            result.truncate(plan.target_size(source_size))
+
+    if incremental:
+        stat = output.stat()
+        state = PatchedDiscState(IsoIdentity.from_path(source), stat.st_size, stat.st_mtime_ns, files)
+        write_atomically(_state_path(output), json.dumps(state.to_json()).encode("utf-8"))
+
+
+def write_bps_patch(source: Path, output: Path, game_root: Path) -> None:
+    """
+    Writes a BPS patch into `output`, which turns the disc at `source` into what `patch_disc` would write.
+    The patch only has the modified files, so it's much smaller than the disc.
+    :raise UnsupportedPatchError: Same as `patch_disc`.
+    """
+    with source.open("rb") as disc:
+        plan = _plan_patch(disc, game_root)
+
+    bps.create_patch(source, output, plan.target_size(source.stat().st_size), plan.changes())
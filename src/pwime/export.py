@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import dataclasses
+import time
+from typing import TYPE_CHECKING
+
+from pwime.batch import base_manager, map_with_base_manager, used_assets
+from pwime.export_cache import clear_export_cache
+from pwime.project import Project, ProjectFile
+
+if TYPE_CHECKING:
+    import argparse
+    from pathlib import Path
+
+FORMAT_SUFFIXES = {
+    "iso": ".iso",
+    "bps": ".bps",
+    "directory": "",
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class ExportTask:
+    project: Path
+    output: Path
+    incremental: bool
+    use_cache: bool
+
+
+@dataclasses.dataclass(frozen=True)
+class ExportResult:
+    task: ExportTask
+    seconds: float
+    error: str | None
+
+
+def _export(task: ExportTask) -> ExportResult:
+    start = time.perf_counter()
+    try:
+        project_file = ProjectFile.read(task.project)
+        manager = base_manager()
+        if project_file.game != manager.target_game:
+            raise ValueError(f"The project is for {project_file.game.name}, not {manager.target_game.name}")
+
+        project = Project.from_project_file(task.project, project_file, manager)
+        project.export_to(task.output, incremental=task.incremental, use_cache=task.use_cache, jobs=1)
+    except Exception as e:
+        return ExportResult(task, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+
+    return ExportResult(task, time.perf_counter() - start, None)
+
+
+def run_cli(args: argparse.Namespace) -> None:
+    projects: list[Path] = args.projects
+    output_dir: Path = args.output_dir
+
+    suffix = FORMAT_SUFFIXES[args.format]
+    tasks = [
+        ExportTask(project, output_dir.joinpath(f"{project.stem}{suffix}"), args.incremental, args.cache)
+        for project in projects
+    ]
+    outputs = [task.output for task in tasks]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError("More than one project would be exported to the same path, as they have the same name")
+
+    if args.clear_cache:
+        clear_export_cache()
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    failures = 0
+
+    for result in map_with_base_manager(
+        _export,
+        tasks,
+        args.jobs,
+        args.base_iso,
+        args.game,
+        memory_map=args.memory_map,
+        preload=used_assets(projects),
+    ):
+        if result.error is not None:
+            failures += 1
+            print(f"Failed to export {result.task.project} after {result.seconds:.1f}s: {result.error}")
+        else:
+            print(f"Exported {result.task.project} to {result.task.output} in {result.seconds:.1f}s.")
+
+    print(f"Exported {len(tasks) - failures} of {len(tasks)} projects in {time.perf_counter() - start:.1f}s.")
+    if failures:
+        raise SystemExit(1)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import shutil
+import tempfile
+from pathlib import Path
+
+from pwime.util.cache_dir import get_cache_path
+
+_COMPLETE_MARKER = "complete"
+_MAX_SIZE = 8 * 1024 * 1024 * 1024
+"""How much the cached results can take, before the least recently used are removed."""
+
+
+def _cache_root() -> Path:
+    return get_cache_path("exports")
+
+
+def _hard_link_tree(source: Path, output: Path) -> None:
+    """Same as `link_extracted_game`, but fails instead of copying files that can't be hard-linked."""
+    for source_file in source.rglob("*"):
+        if not source_file.is_file():
+            continue
+
+        target = output.joinpath(source_file.relative_to(source))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.unlink(missing_ok=True)
+        target.hardlink_to(source_file)
+
+
+def _tree_size(root: Path) -> int:
+    return sum(path.stat().st_size for path in root.rglob("*") if path.is_file())
+
+
+def evict_export_cache(max_size: int = _MAX_SIZE) -> None:
+    """Removes the least recently used results, until the rest take at most `max_size` bytes."""
+    entries = []
+    for root in _cache_root().glob("*"):
+        try:
+            last_used = root.joinpath(_COMPLETE_MARKER).stat().st_mtime_ns
+        except OSError:
+            # Still being stored by another export
+            continue
+        entries.append((last_used, root, _tree_size(root)))
+
+    total = sum(size for _, _, size in entries)
+    for _, root, size in sorted(entries):
+        if total <= max_size:
+            break
+        shutil.rmtree(root, ignore_errors=True)
+        total -= size
+
+
+def clear_export_cache() -> None:
+    """Removes all cached results. Exports that are links to them are kept."""
+    shutil.rmtree(_cache_root(), ignore_errors=True)
+
+
+class ExportCache:
+    """
+    Results of previous exports, stored in the user cache by a key that identifies everything the result depends on.
+    Results are shared with outputs using hard links, so outputs must be replaced and never written to.
+    Results that can't be hard-linked aren't cached, as copying them would take as long as exporting.
+    """
+
+    def __init__(self, key: str):
+        self.root = _cache_root().joinpath(key)
+
+    def _result_path(self, output: Path, is_directory: bool) -> Path:
+        return self.root.joinpath("game" if is_directory else f"result{output.suffix.lower()}")
+
+    def restore(self, output: Path, is_directory: bool) -> bool:
+        """Makes `output` be the cached result, if there's one that can be linked there. Returns if there was."""
+        marker = self.root.joinpath(_COMPLETE_MARKER)
+        if not marker.is_file():
+            return False
+
+        try:
+            if is_directory:
+                output.mkdir(parents=True, exist_ok=True)
+                _hard_link_tree(self._result_path(output, True), output)
+            else:
+                output.unlink(missing_ok=True)
+                output.hardlink_to(self._result_path(output, False))
+        except OSError:
+            # In another file system, or evicted by another export meanwhile
+            return False
+
+        # Marks it as the most recently used
+        marker.touch()
+        return True
+
+    def store(self, output: Path) -> None:
+        """
+        Caches the export that was just written to `output`, unless it can't be hard-linked.
+        Then evicts the least recently used results, when the cache is over its size.
+        """
+        marker = self.root.joinpath(_COMPLETE_MARKER)
+        marker.unlink(missing_ok=True)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        is_directory = output.is_dir()
+        result = self._result_path(output, is_directory)
+        try:
+            if is_directory:
+                shutil.rmtree(result, ignore_errors=True)
+                _hard_link_tree(output, result)
+            else:
+                # Each store links in its own directory, as others for the same export may happen at the same time
+                with tempfile.TemporaryDirectory(dir=self.root) as temp_dir:
+                    temp_path = Path(temp_dir, result.name)
+                    temp_path.hardlink_to(output)
+                    temp_path.replace(result)
+        except OSError:
+            shutil.rmtree(self.root, ignore_errors=True)
+            return
+
+        marker.touch()
+        evict_export_cache()
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import functools
+import io
+import mmap
+import os
+import queue
+import shutil
+import typing
+import weakref
+
+from retro_data_structures.asset_manager import PathFileWriter
+from retro_data_structures.disc.game_disc import GameDisc
+from retro_data_structures.file_provider import FileProvider, IsoFileProvider, PathFileProvider
+
+from pwime.parsed_cache import retro_data_structures_version
+
+if typing.TYPE_CHECKING:
+    from pathlib import Path
+
+_CHECKED_RDS_VERSIONS = ((0, 40), (1, 0))
+"""Versions of retro-data-structures, from inclusive to exclusive, whose private GameDisc members are used."""
+
+
+class _PositionalFile:
+    """Reads at absolute offsets of a file using a single descriptor, which is safe from many threads at once."""
+
+    def __init__(self, path: Path):
+        self._fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        self._finalizer = weakref.finalize(self, os.close, self._fd)
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        chunks = []
+        while size > 0:
+            chunk = os.pread(self._fd, size, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        self._finalizer()
+
+
+class _HandlePool:
+    """Same as `_PositionalFile`, for platforms without `os.pread`. Each concurrent read uses its own handle."""
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._handles: queue.SimpleQueue[typing.BinaryIO] = queue.SimpleQueue()
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        try:
+            handle = self._handles.get_nowait()
+        except queue.Empty:
+            handle = self._path.open("rb")
+
+        try:
+            handle.seek(offset)
+            return handle.read(size)
+        finally:
+            self._handles.put(handle)
+
+    def close(self) -> None:
+        while not self._handles.empty():
+            self._handles.get_nowait().close()
+
+
+class _MappedFile:
+    """Memory-maps the whole file, so reads are served from the page cache without a system call each."""
+
+    def __init__(self, path: Path):
+        with path.open("rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+    def read_at(self, offset: int, size: int) -> memoryview:
+        return self._view[offset : offset + size]
+
+    def close(self) -> None:
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Views of it are still in use, so it's closed once they're all gone
+            pass
+
+
+type RandomAccessSource = _PositionalFile | _HandlePool | _MappedFile
+
+
+@functools.cache
+def _can_locate_files() -> bool:
+    major, minor = (int(part) for part in retro_data_structures_version().split(".")[:2])
+    start, end = _CHECKED_RDS_VERSIONS
+    return start <= (major, minor) < end and hasattr(GameDisc, "_get_file_entry")
+
+
+def _file_location(disc: GameDisc, name: str) -> tuple[int, int] | None:
+    """
+    The offset and size of the file in the disc, or None when it can't be read directly, as for Wii discs, whose data
+    is encrypted. GameDisc has no public way of finding this, so its private members are used, but only with the
+    retro-data-structures versions they're known to work with.
+    """
+    if not _can_locate_files() or getattr(disc, "_is_wii", True):
+        return None
+
+    entry = disc._get_file_entry(name)
+    return entry.offset, entry.size
+
+
+class _DiscRangeReader(io.RawIOBase):
+    """A file inside the disc, with its own position so it doesn't interfere with other readers."""
+
+    def __init__(self, source: RandomAccessSource, offset: int, size: int):
+        super().__init__()
+        self._source = source
+        self._offset = offset
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: typing.Any) -> int:
+        size = max(0, min(len(buffer), self._size - self._position))
+        data = self._source.read_at(self._offset + self._position, size)
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET, /) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        self._position = offset
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+class ConcurrentIsoFileProvider(IsoFileProvider):
+    """
+    An IsoFileProvider that can be read from many threads at the same time, without any locking.
+    All reads use positional reads on a single descriptor instead of opening and seeking a new handle each time.
+    With `memory_map`, the ISO is memory-mapped instead. The data is still copied, but from the page cache.
+    Wii discs, whose data is encrypted, are read as usual.
+    """
+
+    def __init__(self, iso_path: Path, memory_map: bool = False):
+        super().__init__(iso_path)
+        self._source: RandomAccessSource
+        if memory_map:
+            self._source = _MappedFile(iso_path)
+        elif hasattr(os, "pread"):
+            self._source = _PositionalFile(iso_path)
+        else:
+            self._source = _HandlePool(iso_path)
+
+    def __repr__(self) -> str:
+        return f"<ConcurrentIsoFileProvider {self.iso_path}>"
+
+    def open_binary(self, name: str) -> typing.BinaryIO:
+        location = _file_location(self.game_disc, name)
+        if location is None:
+            return super().open_binary(name)
+
+        reader = io.BufferedReader(_DiscRangeReader(self._source, *location))
+        return typing.cast("typing.BinaryIO", reader)
+
+    def read_binary(self, name: str) -> bytes:
+        location = _file_location(self.game_disc, name)
+        if location is None:
+            return super().read_binary(name)
+
+        return bytes(self._source.read_at(*location))
+
+    def close(self) -> None:
+        self._source.close()
+
+
+def is_extracted_game(path: Path) -> bool:
+    """If the path is a directory with an extracted game, as used by `PathFileProvider`."""
+    return path.joinpath("files").is_dir() and path.joinpath("sys", "main.dol").is_file()
+
+
+def open_game(path: Path, memory_map: bool = False) -> FileProvider:
+    """Creates a provider for the game at the path, which is either an ISO or an extracted game."""
+    if path.is_dir():
+        return PathFileProvider(path)
+    return ConcurrentIsoFileProvider(path, memory_map=memory_map)
+
+
+def provider_path(provider: FileProvider) -> Path:
+    """The ISO or directory the provider reads from."""
+    if isinstance(provider, PathFileProvider):
+        return provider.root
+    if isinstance(provider, IsoFileProvider):
+        return provider.iso_path
+    raise TypeError(f"Unsupported provider: {provider}")
+
+
+def check_separate_games(source: Path, output: Path) -> None:
+    """
+    :raise ValueError: If writing the extracted game `output` would change the extracted game `source`, as they're
+    the same directory or one is inside the other.
+    """
+    source = source.resolve()
+    output = output.resolve()
+    if output.is_relative_to(source) or source.is_relative_to(output):
+        raise ValueError(f"Can't write a game into {output}, as it overlaps the game in {source}")
+
+
+def link_extracted_game(source: Path, output: Path) -> None:
+    """
+    Makes `output` have the same files as the extracted game in `source`, using hard links when possible.
+    Files already in `output` are replaced, never written to, as they may be links to other files.
+    :raise ValueError: See `check_separate_games`.
+    """
+    check_separate_games(source, output)
+    for source_file in source.rglob("*"):
+        if not source_file.is_file():
+            continue
+
+        target = output.joinpath(source_file.relative_to(source))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.unlink(missing_ok=True)
+        try:
+            target.hardlink_to(source_file)
+        except OSError:
+            shutil.copy2(source_file, target)
+
+
+class ReplacingFileWriter(PathFileWriter):
+    """A PathFileWriter that replaces files instead of writing to them, so hard links to other files stay intact."""
+
+    def open_text(self, name: str) -> typing.TextIO:
+        self.file_root.joinpath(name).unlink(missing_ok=True)
+        return super().open_text(name)
+
+    def open_binary(self, name: str) -> typing.BinaryIO:
+        self.file_root.joinpath(name).unlink(missing_ok=True)
+        return super().open_binary(name)
+
+    def write_dol(self, data: bytes) -> None:
+        self.root.joinpath("sys/main.dol").unlink(missing_ok=True)
+        super().write_dol(data)
@@ -7,7 +7,7 @@ from imgui_bundle import imgui
 from retro_data_structures.formats import Strg
 
 from pwime.gui.editor.base_window import BaseWindow
-from pwime.operations.base import Operation
+from pwime.operations.base import Operation, check_asset
 
 if TYPE_CHECKING:
     from pwime.project import Project
@@ -32,6 +32,7 @@ class StrgEditOperation(Operation):
         else:
             self.old_value = asset.get_strings(self.language)[self.index]
         asset.set_single_string(self.index, self.new_text, self.language)
+        project.asset_manager.mark_dirty(self.asset_id)
 
     @override
     def undo(self, project: Project) -> None:
@@ -43,6 +44,28 @@ class StrgEditOperation(Operation):
                 asset.set_single_string(self.index, old, language)
         else:
             asset.set_single_string(self.index, self.old_value, self.language)
+        project.asset_manager.mark_dirty(self.asset_id)
+
+    @override
+    def target_asset(self) -> int:
+        return self.asset_id
+
+    @override
+    def validate(self, project: Project) -> list[str]:
+        """Problems if the STRG doesn't have the language, or the string at the index."""
+        problems = check_asset(project.asset_manager, self.asset_id, "STRG")
+        if problems:
+            return problems
+
+        asset = project.asset_manager.get_file(self.asset_id, type_hint=Strg)
+        if self.language is not None and self.language not in asset.get_language_list():
+            return [f"STRG 0x{self.asset_id:08X} has no {self.language} strings"]
+
+        return [
+            f"String {self.index} doesn't exist in {language}, which has {len(asset.get_strings(language))} strings"
+            for language in ([self.language] if self.language is not None else asset.get_language_list())
+            if not 0 <= self.index < len(asset.get_strings(language))
+        ]
 
     @override
     def to_json(self) -> JsonObject:
@@ -73,6 +96,15 @@ class StrgEditOperation(Operation):
         overwrite_language = self.language is None or operation.language == self.language
         return operation.asset_id == self.asset_id and overwrite_language and operation.index == self.index
 
+    @override
+    def merge(self, later: Operation) -> Operation | None:
+        """The later one, if it changes the same string."""
+        if not isinstance(later, StrgEditOperation) or later.language != self.language:
+            return None
+        if later.overwrites_operation(self):
+            return dataclasses.replace(later, old_value=self.old_value)
+        return None
+
     @override
     def describe(self) -> str:
         """Human-readable description of this operation. For use in the history tab."""
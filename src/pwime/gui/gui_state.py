@@ -2,13 +2,16 @@ from __future__ import annotations
 
 import dataclasses
 import functools
+import logging
 import tempfile
+import time
 import typing
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import TYPE_CHECKING
 
 from imgui_bundle._imgui_bundle import hello_imgui
-from retro_data_structures.file_provider import IsoFileProvider
 
+from pwime.file_provider import open_game
 from pwime.preferences import Preferences
 from pwime.project import Project
 
@@ -18,12 +21,16 @@ if TYPE_CHECKING:
     from imgui_bundle import portable_file_dialogs
     from retro_data_structures.game_check import Game
 
-    from pwime.asset_manager import OurAssetManager
+    from pwime.asset_manager import OurAssetManager, Providers
     from pwime.gui.editor.base_window import BaseWindow
     from pwime.gui.popup import CurrentPopup
     from pwime.gui.script_instance import ScriptInstanceState
 
 
+AUTOSAVE_INTERVAL = 30.0
+"""Seconds between each autosave of the open project."""
+
+
 class FilteredAssetList(typing.NamedTuple):
     types: frozenset[str]
     filter: str
@@ -36,7 +43,7 @@ class GuiState:
     instance_state: ScriptInstanceState
     preferences: Preferences
     editors: dict[int, BaseWindow] = dataclasses.field(default_factory=dict)
-    file_providers: dict[Game, IsoFileProvider] = dataclasses.field(default_factory=dict)
+    file_providers: Providers = dataclasses.field(default_factory=dict)
     project: Project | None = None
     current_project_path: Path | None = None
     current_popup: CurrentPopup | None = None
@@ -45,6 +52,12 @@ class GuiState:
     pending_pre_frame_tasks: list[typing.Callable[[], None]] = dataclasses.field(default_factory=list)
     selected_asset_types: set[str] = dataclasses.field(default_factory=lambda: {"MLVL"})
     asset_filter: str = ""
+    _file_list: FilteredAssetList | None = None
+    _autosave_executor: ThreadPoolExecutor = dataclasses.field(
+        default_factory=lambda: ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+    )
+    _autosave: Future[None] | None = None
+    _last_autosave: float = dataclasses.field(default_factory=time.monotonic)
 
     @property
     def asset_manager(self) -> OurAssetManager | None:
@@ -53,8 +66,31 @@ class GuiState:
         return self.project.asset_manager
 
     def open_project(self, path: Path) -> None:
-        self.project = Project.load_from_file(path, self.file_providers)
+        self.project = Project.load_from_file(
+            path, self.file_providers, cache_parsed_assets=self.preferences.cache_parsed_assets
+        )
         self.current_project_path = path
+        self._file_list = None
+
+    def autosave_if_needed(self) -> None:
+        """
+        Saves the open project every AUTOSAVE_INTERVAL seconds, in the background so frames aren't blocked.
+        Only new operations are appended to the project file. Checkpoints are only created when saving explicitly.
+        """
+        if self.project is None or self.current_project_path is None:
+            return
+
+        if self._autosave is not None and not self._autosave.done():
+            return
+
+        now = time.monotonic()
+        if now - self._last_autosave < AUTOSAVE_INTERVAL:
+            return
+
+        self._last_autosave = now
+        # Only the journal is written. Checkpoints encode assets, which can take a while, so only saving creates them
+        self._autosave = self._autosave_executor.submit(self.project.save_to_file, self.current_project_path)
+        self._autosave.add_done_callback(_log_autosave_failure)
 
     def get_asset_name(self, asset_id: int) -> str:
         name = self.asset_manager.asset_names.get(asset_id)
@@ -72,14 +108,20 @@ class GuiState:
             name_filter,
             [
                 asset
-                for asset in manager.all_asset_ids()
-                if manager.get_asset_type(asset) in asset_types
-                and (not name_filter or name_filter.lower() in self.get_asset_name(asset).lower())
+                for asset in manager.asset_ids_of_types(asset_types)
+                if not name_filter or name_filter.lower() in self.get_asset_name(asset).lower()
             ],
         )
 
+    def file_list(self) -> FilteredAssetList:
+        """The assets for the File List, filtered again only when the selected types or filter change."""
+        key = (frozenset(self.selected_asset_types), self.asset_filter)
+        if self._file_list is None or self._file_list[:2] != key:
+            self._file_list = self.filtered_asset_list(*key)
+        return self._file_list
+
     def load_iso(self, game: Game, iso: Path) -> None:
-        self.file_providers[game] = IsoFileProvider(iso)
+        self.file_providers[game] = open_game(iso, memory_map=self.preferences.memory_map_isos)
 
     def restore_from_preferences(self):
         for game, path in self.preferences.game_iso_paths.items():
@@ -101,6 +143,11 @@ class GuiState:
             window.is_visible = True
 
 
+def _log_autosave_failure(future: Future[None]) -> None:
+    if future.exception() is not None:
+        logging.getLogger(__name__).error("Autosave failed", exc_info=future.exception())
+
+
 @functools.cache
 def state() -> GuiState:
     from pwime.gui.script_instance import ScriptInstanceState
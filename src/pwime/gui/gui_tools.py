@@ -3,6 +3,7 @@ from pathlib import Path
 
 from imgui_bundle import imgui, portable_file_dialogs
 
+from pwime.file_provider import is_extracted_game
 from pwime.util import imgui_helper
 
 
@@ -48,12 +49,13 @@ class PathPrompt:
 
 def _valid_existing_iso_path(path: str) -> bool:
     p = Path(path)
-    return p.suffix == ".iso" and p.is_file()
+    return (p.suffix == ".iso" and p.is_file()) or is_extracted_game(p)
 
 
 def _valid_new_iso_path(path: str) -> bool:
+    # Paths with the .bps suffix are exported as a patch, and others without the .iso suffix as an extracted game
     p = Path(path)
-    return p.suffix == ".iso" and p.parent.is_dir()
+    return p.parent.is_dir() and (p.suffix in {".iso", ".bps"} or not p.is_file())
 
 
 class FilePrompt(PathPrompt):
@@ -93,7 +95,7 @@ class IsoPrompt(FilePrompt):
     def __init__(self, initial_value: str, save_file: bool, title: str = "Game ISO"):
         super().__init__(
             title,
-            "Path to a game ISO",
+            "Path to a game ISO or extracted game",
             "Select ISO",
             ["*.iso"],
             initial_value,
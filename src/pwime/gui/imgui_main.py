@@ -4,6 +4,7 @@ import datetime
 import logging
 import os
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import humanize
@@ -11,12 +12,14 @@ from imgui_bundle import hello_imgui, imgui, imgui_node_editor, immapp
 from retro_data_structures.formats.txtr import TXTRHeader
 from retro_data_structures.game_check import Game
 
+from pwime.disc_patch import UnsupportedPatchError
+from pwime.export_cache import clear_export_cache
 from pwime.gui.editor.mlvl_window import MlvlWindow
 from pwime.gui.editor.strg_window import StrgWindow
 from pwime.gui.editor.txtr_window import TxtrWindow
 from pwime.gui.gui_state import state
 from pwime.gui.gui_tools import FilePrompt, IsoPrompt
-from pwime.gui.popup import ConfirmCancelActionPopup
+from pwime.gui.popup import ConfirmCancelActionPopup, CurrentImguiPopup
 from pwime.gui.project_popup import NewProjectPopup, validate_project_file
 from pwime.gui.select_iso_popup import SelectIsoPopup
 from pwime.util import imgui_helper
@@ -24,6 +27,8 @@ from pwime.util import imgui_helper
 if typing.TYPE_CHECKING:
     import argparse
 
+    from pwime.project import PreparedExport
+
 POSSIBLE_ASSET_TYPES = [
     "MLVL",
     "STRG",
@@ -55,13 +60,7 @@ def main_gui() -> None:
 
             imgui.table_headers_row()
 
-            for i in asset_manager.all_asset_ids():
-                if asset_manager.get_asset_type(i) not in state().selected_asset_types:
-                    continue
-
-                if state().asset_filter.lower() not in state().get_asset_name(i):
-                    continue
-
+            for i in state().file_list().ids:
                 imgui.table_next_row()
 
                 imgui.table_next_column()
@@ -167,8 +166,10 @@ class OpenProjectPopup(ConfirmCancelActionPopup):
 
 
 class ExportProjectPopup(ConfirmCancelActionPopup):
-    def __init__(self):
+    def __init__(self, error: str | None = None):
+        """:param error: Why exporting to the previously chosen path failed, if it did."""
         self._confirm_action_text = "Export project"
+        self._error = error
 
         initial_value = ""
         if state().preferences.last_export_path is not None:
@@ -184,6 +185,8 @@ class ExportProjectPopup(ConfirmCancelActionPopup):
 
     def render_modal(self) -> bool:
         self.iso_prompt.render()
+        if self._error is not None:
+            imgui.text(f"Exporting failed: {self._error}")
         return super().render_modal()
 
     def _validate(self) -> bool:
@@ -192,14 +195,83 @@ class ExportProjectPopup(ConfirmCancelActionPopup):
     def _perform_action(self) -> None:
         preferences = state().preferences
         preferences.last_export_path = Path(self.iso_prompt.value)
-        state().project.export_to(preferences.last_export_path)
+        try:
+            export = state().project.prepare_export(
+                preferences.last_export_path,
+                incremental=preferences.incremental_exports,
+                use_cache=preferences.cache_exports,
+            )
+        except (UnsupportedPatchError, ValueError) as e:
+            # Such as a patch for an extracted game, or the path being the game itself, so another path can be chosen
+            state().current_popup = ExportProjectPopup(str(e))
+            return
+
         preferences.write_to_user_home()
+        state().current_popup = ExportProgressPopup(export)
+
+
+class ExportProgressPopup(CurrentImguiPopup):
+    """Writes a prepared export in the background, showing how far along it is."""
+
+    def __init__(self, export: PreparedExport):
+        self._progress = 0.0
+        self._current_name = ""
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        self._export = executor.submit(export.write, self._update_progress)
+        executor.shutdown(wait=False)
+
+    def _update_progress(self, progress: float, name: str, bytes: int) -> None:
+        # Called by the export thread, and only read when rendering
+        self._progress = progress
+        self._current_name = name
+
+    def _popup_name(self) -> str:
+        return "Exporting Project"
+
+    def render_modal(self) -> bool:
+        if not self._export.done():
+            imgui.text(f"Writing {self._current_name}" if self._current_name else "Writing the game...")
+            imgui.progress_bar(self._progress, imgui.ImVec2(400, 0))
+            return True
+
+        error = self._export.exception()
+        if error is None:
+            imgui.text("The project was exported.")
+        else:
+            imgui.text(f"Exporting failed: {error}")
+        return not imgui.button("Close")
 
 
 def _set_assets_path() -> None:
     hello_imgui.set_assets_folder(state().temp_assets_path)
 
 
+_PREFERENCE_TOGGLES = [
+    # Only affects projects opened afterward
+    ("Cache parsed assets on disk", "cache_parsed_assets"),
+    # Only affects ISOs selected afterward
+    ("Memory-map ISOs", "memory_map_isos"),
+    # Exporting again to the same ISO only writes what changed since
+    ("Incremental ISO exports", "incremental_exports"),
+    # Exporting a project that didn't change since it was last exported reuses that result
+    ("Cache export results", "cache_exports"),
+]
+
+
+def _show_preferences_menu() -> None:
+    if imgui.menu_item("Select ISOs", "", False)[0]:
+        state().current_popup = SelectIsoPopup(state().preferences)
+
+    preferences = state().preferences
+    for label, attribute in _PREFERENCE_TOGGLES:
+        if imgui.menu_item(label, "", getattr(preferences, attribute))[0]:
+            setattr(preferences, attribute, not getattr(preferences, attribute))
+            preferences.write_to_user_home()
+
+    if imgui.menu_item("Clear export cache", "", False)[0]:
+        clear_export_cache()
+
+
 def _show_menu() -> None:
     if imgui.begin_menu("Project"):
         if imgui.menu_item("New", "", False)[0]:
@@ -210,7 +282,8 @@ def _show_menu() -> None:
 
         with imgui_helper.disabled(state().project is None):
             if imgui.menu_item("Save", "", False)[0]:
-                state().project.save_to_file(state().current_project_path)
+                project = state().project
+                project.save_to_file(state().current_project_path, project.create_checkpoint_if_due())
 
             if imgui.menu_item("Export", "", False)[0]:
                 state().current_popup = ExportProjectPopup()
@@ -222,17 +295,34 @@ def _show_menu() -> None:
         imgui.end_menu()
 
     if imgui.begin_menu("Preferences"):
-        if imgui.menu_item("Select ISOs", "", False)[0]:
-            state().current_popup = SelectIsoPopup(state().preferences)
+        _show_preferences_menu()
         imgui.end_menu()
 
-    if state().current_popup is not None:
-        if not state().current_popup.render():
-            state().current_popup = None
+    popup = state().current_popup
+    # Popups may replace themselves with another when done
+    if popup is not None and not popup.render() and state().current_popup is popup:
+        state().current_popup = None
 
     imgui.text_disabled("Bai")
 
 
+def _show_status() -> None:
+    asset_manager = state().asset_manager
+    if asset_manager is not None:
+        cache = asset_manager.memory_files
+        imgui.text(
+            f"Parsed assets: {len(cache)} cached ({humanize.naturalsize(cache.resident_size, binary=True)}),"
+            f" {len(asset_manager.dirty_files)} modified, {cache.hit_rate:.0%} hit rate"
+        )
+        decompressed = asset_manager.decompressed_files
+        imgui.same_line()
+        imgui.text(
+            f"| Decompressed: {len(decompressed)} cached"
+            f" ({humanize.naturalsize(decompressed.resident_size, binary=True)}),"
+            f" {decompressed.hits} hits, {decompressed.misses} misses"
+        )
+
+
 def _any_backend_event_callback(event) -> bool:
     print("EVENT!", event)
     return False
@@ -245,6 +335,8 @@ def _pre_new_frame() -> None:
     for task in pending_tasks:
         task()
 
+    state().autosave_if_needed()
+
 
 def focus_on_file_list() -> None:
     tries = 2
@@ -270,6 +362,7 @@ def run_gui(args: argparse.Namespace) -> None:
 
     runner_params = hello_imgui.RunnerParams()
     runner_params.callbacks.show_menus = _show_menu
+    runner_params.callbacks.show_status = _show_status
     runner_params.callbacks.pre_new_frame = _pre_new_frame
     runner_params.callbacks.any_backend_event_callback = _any_backend_event_callback
     runner_params.app_window_params.window_title = "Prime World Interactive Media Editor"
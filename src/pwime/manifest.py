@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+import typing
+
+from pwime.util.cache_dir import get_cache_path
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+    from pathlib import Path
+
+    from retro_data_structures.asset_manager import AssetManager
+    from retro_data_structures.base_resource import AssetId, AssetType
+
+    from pwime.util.json_lib import JsonObject
+
+_SCHEMA_VERSION = 2
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+@dataclasses.dataclass(frozen=True)
+class IsoIdentity:
+    """
+    Identifies a specific version of an ISO file, changing whenever the file is modified.
+    For an extracted game, it's the total size and latest modification of everything in the directory.
+    """
+
+    path: str
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def from_path(cls, path: Path) -> typing.Self:
+        stat = path.stat()
+        size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        if path.is_dir():
+            size = 0
+            for child in path.rglob("*"):
+                child_stat = child.stat()
+                if child.is_file():
+                    size += child_stat.st_size
+                mtime_ns = max(mtime_ns, child_stat.st_mtime_ns)
+
+        return cls(os.fspath(path.resolve()), size, mtime_ns)
+
+    @property
+    def cache_key(self) -> str:
+        return hashlib.sha1(f"{self.path}|{self.size}|{self.mtime_ns}".encode()).hexdigest()
+
+    def to_json(self) -> JsonObject:
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_json(cls, data: JsonObject) -> typing.Self:
+        return cls(**data)
+
+
+@dataclasses.dataclass(frozen=True)
+class ManifestEntry:
+    """
+    Describes an asset, both as it's stored in the pak and after decompression.
+    For uncompressed assets, both sizes and hashes are the same.
+    """
+
+    type: AssetType
+    compressed: bool
+    stored_size: int
+    stored_hash: str
+    size: int
+    hash: str
+
+    def has_same_contents(self, other: ManifestEntry | None) -> bool:
+        """If both assets are the same after decompression, regardless of how they're stored."""
+        return other is not None and (self.type, self.size, self.hash) == (other.type, other.size, other.hash)
+
+    def to_json(self) -> JsonObject:
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_json(cls, data: JsonObject) -> typing.Self:
+        return cls(**data)
+
+
+def hash_assets(
+    manager: AssetManager,
+    asset_ids: Iterable[AssetId],
+    reference: Mapping[AssetId, ManifestEntry] | None = None,
+) -> dict[AssetId, ManifestEntry]:
+    """
+    Calculates the manifest entries for the given assets, as they're stored in the manager's paks.
+    :param reference: Entries of another manifest that likely has the same assets. When an asset is stored with the
+    same type, compression and bytes as there, the decompressed size and hash are copied instead of decompressing it.
+    """
+    result = {}
+    for asset_id in asset_ids:
+        raw = manager.get_raw_asset(asset_id)
+        stored_size = len(raw.raw_data)
+        stored_hash = content_hash(raw.raw_data)
+
+        known = reference.get(asset_id) if reference is not None else None
+        if (
+            known is not None
+            and known.type == raw.type
+            and known.compressed == raw.compressed
+            and known.stored_size == stored_size
+            and known.stored_hash == stored_hash
+        ):
+            size, data_hash = known.size, known.hash
+        elif raw.compressed:
+            data = raw.data
+            size, data_hash = len(data), content_hash(data)
+        else:
+            size, data_hash = stored_size, stored_hash
+
+        result[asset_id] = ManifestEntry(raw.type, raw.compressed, stored_size, stored_hash, size, data_hash)
+    return result
+
+
+@dataclasses.dataclass(frozen=True)
+class AssetManifest:
+    """The type, size and content hash of every asset of an ISO."""
+
+    identity: IsoIdentity
+    entries: dict[AssetId, ManifestEntry]
+
+    def different_assets(self, other: AssetManifest) -> list[AssetId]:
+        """All asset ids of this manifest that are missing or have different contents in `other`, sorted."""
+        return sorted(
+            asset_id
+            for asset_id, entry in self.entries.items()
+            if not entry.has_same_contents(other.entries.get(asset_id))
+        )
+
+    def to_json(self) -> JsonObject:
+        return {
+            "schema_version": _SCHEMA_VERSION,
+            "identity": self.identity.to_json(),
+            "assets": {f"{asset_id:08x}": entry.to_json() for asset_id, entry in sorted(self.entries.items())},
+        }
+
+    @classmethod
+    def from_json(cls, data: JsonObject) -> typing.Self:
+        if data["schema_version"] != _SCHEMA_VERSION:
+            raise ValueError(f"Unsupported manifest schema version: {data['schema_version']}")
+
+        return cls(
+            identity=IsoIdentity.from_json(data["identity"]),
+            entries={int(asset_id, 16): ManifestEntry.from_json(entry) for asset_id, entry in data["assets"].items()},
+        )
+
+    def write_to_path(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_json()))
+
+    @classmethod
+    def read_from_path(cls, path: Path) -> typing.Self:
+        with path.open() as f:
+            return cls.from_json(json.load(f))
+
+
+def _cached_manifest_path(identity: IsoIdentity) -> Path:
+    return get_cache_path("manifests", f"{identity.cache_key}.json")
+
+
+def read_cached_manifest(identity: IsoIdentity) -> AssetManifest | None:
+    """Gets the manifest previously stored for the given ISO, if there's any."""
+    try:
+        return AssetManifest.read_from_path(_cached_manifest_path(identity))
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def write_cached_manifest(manifest: AssetManifest) -> None:
+    manifest.write_to_path(_cached_manifest_path(manifest.identity))
@@ -4,10 +4,24 @@ from abc import ABC
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
+    from retro_data_structures.base_resource import AssetId, AssetType
+
+    from pwime.asset_manager import OurAssetManager
     from pwime.project import Project
     from pwime.util.json_lib import JsonObject
 
 
+def check_asset(manager: OurAssetManager, asset_id: AssetId, asset_type: AssetType | None = None) -> list[str]:
+    """A problem if the asset doesn't exist, or isn't of the given type."""
+    if not manager.does_asset_exists(asset_id):
+        return [f"Asset 0x{asset_id:08X} doesn't exist"]
+
+    actual_type = manager.get_asset_type(asset_id)
+    if asset_type is not None and actual_type != asset_type:
+        return [f"Asset 0x{asset_id:08X} is a {actual_type}, not a {asset_type}"]
+    return []
+
+
 class Operation(ABC):
     """Represents a change performed to the game files. These changes are reversible and can be persisted to disk."""
 
@@ -20,6 +34,19 @@ class Operation(ABC):
         Can only be called after perform."""
         raise NotImplementedError
 
+    def target_asset(self) -> AssetId:
+        """The asset this operation modifies. When loading a project, it's only performed once that asset is needed."""
+        raise NotImplementedError
+
+    def used_assets(self) -> list[AssetId]:
+        """All assets `perform` reads, including `target_asset`. Used for loading them ahead of time."""
+        return [self.target_asset()]
+
+    def validate(self, project: Project) -> list[str]:
+        """Problems that prevent performing this operation on the project's assets, as they're now.
+        Used for checking that a project still applies, such as after updating retro-data-structures."""
+        return check_asset(project.asset_manager, self.target_asset())
+
     def to_json(self) -> JsonObject:
         """Serializes this operation to a Json."""
         raise NotImplementedError
@@ -29,6 +56,11 @@ class Operation(ABC):
         For when the user quickly does similar actions in a row, such as changing the same field to multiple values."""
         raise NotImplementedError
 
+    def merge(self, later: Operation) -> Operation | None:
+        """An operation with the same result as performing this one and then `later`, or None if there's no such
+        operation. Used when compacting a project."""
+        return None
+
     def describe(self) -> str:
         """Human-readable description of this operation. For use in the history tab."""
         raise NotImplementedError
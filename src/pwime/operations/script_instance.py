@@ -9,7 +9,7 @@ from retro_data_structures.properties import field_reflection
 from retro_data_structures.properties.base_property import BaseObjectType, BaseProperty
 from retro_data_structures.properties.echoes import objects
 
-from pwime.operations.base import Operation
+from pwime.operations.base import Operation, check_asset
 
 if typing.TYPE_CHECKING:
     from retro_data_structures.formats.script_object import ScriptInstance
@@ -73,6 +73,25 @@ def _modified_fields(prop: type[BaseProperty], delta: JsonObject, parent: str =
     return result
 
 
+def _unknown_fields(prop: type[BaseProperty], delta: JsonObject, parent: str = "") -> list[str]:
+    fields = {
+        f"0x{reflection.id:08X}": (name, reflection)
+        for name, reflection in field_reflection.get_reflection(prop).items()
+    }
+    result = []
+
+    for key, value in delta.items():
+        if key not in fields:
+            result.append(f"{parent}{key}")
+            continue
+
+        name, reflection = fields[key]
+        if issubclass(reflection.type, BaseProperty) and field_reflection.get_reflection(reflection.type):
+            result.extend(_unknown_fields(reflection.type, value, f"{parent}{name}."))
+
+    return result
+
+
 def create_patch_for(instance: ScriptInstance, value_path: tuple[str, ...], new_value: typing.Any) -> JsonObject:
     delta = {}
     current_type = instance.script_type
@@ -91,6 +110,36 @@ def create_patch_for(instance: ScriptInstance, value_path: tuple[str, ...], new_
     return delta
 
 
+def create_delta_between(old: BaseProperty, new: BaseProperty) -> JsonObject:
+    """Creates a delta that, when used with `patch_property` on `old`, makes it equal to `new`."""
+    delta = {}
+
+    for name, reflection in field_reflection.get_reflection(type(old)).items():
+        old_value = getattr(old, name)
+        new_value = getattr(new, name)
+        if old_value == new_value:
+            continue
+
+        key = f"0x{reflection.id:08X}"
+        if issubclass(reflection.type, BaseProperty) and field_reflection.get_reflection(reflection.type):
+            delta[key] = create_delta_between(old_value, new_value)
+        else:
+            delta[key] = reflection.to_json(new_value)
+
+    return delta
+
+
+def merge_deltas(first: JsonObject, second: JsonObject) -> JsonObject:
+    """Creates a delta with the same result as using `patch_property` with `first` and then `second`."""
+    result = dict(first)
+    for key, value in second.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = merge_deltas(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
 def patch_property[PropType](prop: PropType, delta: JsonObject) -> None:
     for name, reflection in field_reflection.get_reflection(type(prop)).items():
         key = f"0x{reflection.id:08X}"
@@ -123,12 +172,45 @@ class ScriptInstancePropertyEdit[PropType](Operation):
 
         with instance.edit_properties(self.prop_type) as prop:
             patch_property(prop, self.delta)
+        project.asset_manager.mark_dirty(self.reference.mrea)
 
     def undo(self, project: Project) -> None:
         """Reverts the change."""
         assert self.old_value is not None
         instance = get_instance(project.asset_manager, self.reference)
         instance.set_properties(self.old_value)
+        project.asset_manager.mark_dirty(self.reference.mrea)
+
+    def target_asset(self) -> int:
+        return self.reference.mrea
+
+    def used_assets(self) -> list[int]:
+        return [self.reference.mlvl, self.reference.mrea]
+
+    def validate(self, project: Project) -> list[str]:
+        """Problems if the instance doesn't exist, isn't a `prop_type` or the delta has fields it doesn't have."""
+        manager = project.asset_manager
+        problems = check_asset(manager, self.reference.mlvl, "MLVL") + check_asset(manager, self.reference.mrea, "MREA")
+        if problems:
+            return problems
+
+        mlvl = manager.get_file(self.reference.mlvl, Mlvl)
+        if all(area.mrea_asset_id != self.reference.mrea for area in mlvl.areas):
+            return [f"Asset 0x{self.reference.mrea:08X} isn't an area of 0x{self.reference.mlvl:08X}"]
+
+        try:
+            instance = mlvl.get_area(self.reference.mrea).get_instance(self.reference.instance_id)
+        except KeyError:
+            return [f"Instance `{self.reference.instance_id}` doesn't exist"]
+
+        if not issubclass(instance.script_type, self.prop_type):
+            actual_type = instance.script_type.__name__
+            return [f"Instance `{self.reference.instance_id}` is a {actual_type}, not a {self.prop_type.__name__}"]
+
+        return [
+            f"Field {field} doesn't exist in {self.prop_type.__name__}"
+            for field in _unknown_fields(self.prop_type, self.delta)
+        ]
 
     def _modified_fields(self) -> list[str]:
         return _modified_fields(self.prop_type, self.delta)
@@ -141,6 +223,17 @@ class ScriptInstancePropertyEdit[PropType](Operation):
             return self._modified_fields() == operation._modified_fields()
         return False
 
+    def merge(self, later: Operation) -> Operation | None:
+        """Merges the deltas, if changing the same object."""
+        if isinstance(later, ScriptInstancePropertyEdit):
+            if self.reference != later.reference or self.prop_type != later.prop_type:
+                return None
+
+            result = ScriptInstancePropertyEdit(self.reference, self.prop_type, merge_deltas(self.delta, later.delta))
+            result.old_value = self.old_value
+            return result
+        return None
+
     def describe(self) -> str:
         return (
             f"Edited fields {', '.join(self._modified_fields())} of `{self.reference.instance_id}`,"
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import functools
+import importlib.metadata
+import io
+import pickle
+import struct
+import typing
+
+from retro_data_structures.asset_manager import AssetManager
+from retro_data_structures.base_resource import BaseResource
+from retro_data_structures.formats.mrea import Area
+
+from pwime.util.cache_dir import get_cache_path, write_atomically
+
+if typing.TYPE_CHECKING:
+    from pathlib import Path
+
+    from retro_data_structures.base_resource import AssetId, AssetType
+
+    from pwime.manifest import IsoIdentity
+
+CACHED_ASSET_TYPES: frozenset[AssetType] = frozenset({"MLVL", "MREA"})
+"""Asset types that are slow enough to parse to be worth caching on disk."""
+
+PICKLING_ERRORS = (pickle.PicklingError, TypeError, AttributeError)
+_UNPICKLING_ERRORS = (pickle.UnpicklingError, EOFError, AttributeError, ImportError)
+_SCHEMA_VERSION = 2
+_ENTRY_HEADER = struct.Struct("<Q")
+"""The decompressed size of the asset, before the pickled resource."""
+
+
+class _ManagerlessPickler(pickle.Pickler):
+    """Pickles resources without the asset manager they reference, as it's restored when loading."""
+
+    def persistent_id(self, obj: typing.Any) -> str | None:
+        if isinstance(obj, AssetManager):
+            return "asset_manager"
+        return None
+
+
+class _BuildDataPickler(_ManagerlessPickler):
+    """
+    Pickles only what building the resource needs, without the other resources and areas it references.
+    Layers of a modified MREA reference their area, so that would be the whole world otherwise.
+    """
+
+    def __init__(self, file: typing.BinaryIO, resource: BaseResource):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.resource = resource
+
+    def persistent_id(self, obj: typing.Any) -> str | None:
+        if isinstance(obj, Area) or (isinstance(obj, BaseResource) and obj is not self.resource):
+            return "reference"
+        return super().persistent_id(obj)
+
+
+class _ManagerUnpickler(pickle.Unpickler):
+    def __init__(self, file: typing.BinaryIO, manager: AssetManager | None):
+        super().__init__(file)
+        self.manager = manager
+
+    def persistent_load(self, pid: typing.Any) -> AssetManager | None:
+        if pid == "asset_manager":
+            return self.manager
+        return None
+
+
+def dump_resource(resource: BaseResource) -> bytes:
+    data = io.BytesIO()
+    _ManagerlessPickler(data, pickle.HIGHEST_PROTOCOL).dump(resource)
+    return data.getvalue()
+
+
+def dump_resource_for_build(resource: BaseResource) -> bytes:
+    """
+    Same as `dump_resource`, except other resources and areas it references are left out, and loaded as None.
+    So the loaded resource can only be built.
+    """
+    data = io.BytesIO()
+    _BuildDataPickler(data, resource).dump(resource)
+    return data.getvalue()
+
+
+def load_resource(data: bytes, manager: AssetManager | None) -> BaseResource:
+    """
+    Loads a resource from `dump_resource` or `dump_resource_for_build`, with the given manager in place of the
+    original one.
+    """
+    return _ManagerUnpickler(io.BytesIO(data), manager).load()
+
+
+@functools.cache
+def retro_data_structures_version() -> str:
+    return importlib.metadata.version("retro-data-structures")
+
+
+class ParsedAssetCache:
+    """
+    Parsed assets of an ISO, stored in the user cache.
+    Entries are only valid for the assets as they're in the ISO, and are keyed by the ISO identity and the
+    retro-data-structures version, so any change to either uses a new set of entries.
+    """
+
+    def __init__(self, identity: IsoIdentity):
+        self.root = get_cache_path(
+            "parsed", identity.cache_key, f"rds-{retro_data_structures_version()}", f"v{_SCHEMA_VERSION}"
+        )
+
+    def _path_for(self, asset_id: AssetId) -> Path:
+        return self.root.joinpath(f"{asset_id:08x}.pickle")
+
+    def load(self, asset_id: AssetId, manager: AssetManager) -> tuple[BaseResource, int] | None:
+        """
+        Gets the cached resource for the given asset, along with the decompressed size of the asset.
+        None if it isn't cached.
+        """
+        try:
+            data = self._path_for(asset_id).read_bytes()
+            (size,) = _ENTRY_HEADER.unpack_from(data)
+            return load_resource(data[_ENTRY_HEADER.size :], manager), size
+        except (OSError, struct.error, *_UNPICKLING_ERRORS):
+            return None
+
+    def store(self, asset_id: AssetId, resource: BaseResource, size: int) -> None:
+        """
+        Caches the resource, which must not have been modified since it was parsed. Failures are ignored.
+        :param size: The decompressed size of the asset, so loading it doesn't need to read the asset.
+        """
+        try:
+            write_atomically(self._path_for(asset_id), _ENTRY_HEADER.pack(size) + dump_resource(resource))
+        except (OSError, *PICKLING_ERRORS):
+            pass
@@ -28,6 +28,10 @@ class Preferences:
     last_project_path: Path | None = None
     last_export_path: Path | None = None
     game_iso_paths: dict[Game, Path] = dataclasses.field(default_factory=dict)
+    cache_parsed_assets: bool = False
+    memory_map_isos: bool = False
+    incremental_exports: bool = False
+    cache_exports: bool = False
 
     def read_from_user_home(self) -> None:
         config_path = Path(roaming_dirs.user_config_dir)
@@ -45,12 +49,20 @@ class Preferences:
         self.last_export_path = decode_optional_path(data, "last_export_path")
         for game, path in data.get("game_iso_paths", {}).items():
             self.game_iso_paths[getattr(Game, game)] = Path(path)
+        self.cache_parsed_assets = data.get("cache_parsed_assets", False)
+        self.memory_map_isos = data.get("memory_map_isos", False)
+        self.incremental_exports = data.get("incremental_exports", False)
+        self.cache_exports = data.get("cache_exports", False)
 
     def to_json(self) -> JsonObject:
         return {
             "last_project_path": encode_optional_path(self.last_project_path),
             "last_export_path": encode_optional_path(self.last_export_path),
             "game_iso_paths": {game.name: str(path) for game, path in self.game_iso_paths.items()},
+            "cache_parsed_assets": self.cache_parsed_assets,
+            "memory_map_isos": self.memory_map_isos,
+            "incremental_exports": self.incremental_exports,
+            "cache_exports": self.cache_exports,
         }
 
     def write_to_user_home(self) -> None:
@@ -1,16 +1,31 @@
+import dataclasses
 import datetime
+import functools
+import hashlib
 import json
+import logging
 import os
 import tempfile
+import threading
 import typing
+from collections.abc import Sequence
 from pathlib import Path
 
+from retro_data_structures.file_provider import FileProvider, IsoFileProvider, PathFileProvider
 from retro_data_structures.game_check import Game
 
 import pwime.version
 from pwime.asset_manager import OurAssetManager, Providers
+from pwime.checkpoint import ProjectCheckpoint, checkpoint_path
+from pwime.disc_patch import ProgressCallback, UnsupportedPatchError, patch_disc, write_bps_patch
+from pwime.export_cache import ExportCache
+from pwime.file_provider import ReplacingFileWriter, check_separate_games, link_extracted_game, provider_path
+from pwime.manifest import IsoIdentity
 from pwime.operations import serializer
 from pwime.operations.base import Operation
+from pwime.parsed_cache import retro_data_structures_version
+from pwime.util.cache_dir import write_atomically
+from pwime.util.json_lib import JsonObject
 
 
 class PerformedOperation(typing.NamedTuple):
@@ -18,6 +33,260 @@ class PerformedOperation(typing.NamedTuple):
     moment: datetime.datetime
 
 
+def compact_operations(operations: Sequence[PerformedOperation]) -> list[PerformedOperation]:
+    """
+    Creates the smallest list of operations with the same result as performing all the given ones, by merging
+    operations with `Operation.merge` and dropping operations that are overwritten by a later one.
+    Each resulting operation is placed where the last of the operations it replaces was.
+    """
+    result: list[PerformedOperation] = []
+
+    for performed in operations:
+        operation = performed.operation
+        kept = []
+        for previous in result:
+            merged = previous.operation.merge(operation)
+            if merged is not None:
+                operation = merged
+            elif not operation.overwrites_operation(previous.operation):
+                kept.append(previous)
+
+        kept.append(PerformedOperation(operation, performed.moment))
+        result = kept
+
+    return result
+
+
+JOURNAL_FORMAT = "pwime-journal"
+REWRITE_INTERVAL = 1000
+"""How many records can be appended to a journal before it's written again from scratch."""
+CHECKPOINT_INTERVAL = 200
+"""How many operations can be performed before a new checkpoint is due, see `ProjectCheckpoint`."""
+
+
+def _encode_operation(performed: PerformedOperation) -> JsonObject:
+    return {
+        "time": performed.moment.astimezone(datetime.UTC).isoformat(),
+        "data": performed.operation.to_json(),
+    }
+
+
+def _decode_operation(data: JsonObject) -> PerformedOperation:
+    return PerformedOperation(serializer.decode_from_json(data["data"]), datetime.datetime.fromisoformat(data["time"]))
+
+
+def _json_line(data: JsonObject) -> str:
+    return json.dumps(data, separators=(",", ":")) + "\n"
+
+
+def _operations_hash(operations: Sequence[PerformedOperation]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for performed in operations:
+        digest.update(_json_line(_encode_operation(performed)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclasses.dataclass()
+class ProjectFile:
+    """
+    The contents of a project file, which can be used without loading the game.
+    Project files are journals: a header line, followed by one line per record. Records are either an operation that
+    was added, or how many of the last operations were removed. See `ProjectJournal`.
+    """
+
+    name: str
+    game: Game
+    operations: list[PerformedOperation]
+    journal_records: int | None = None
+    """
+    How many records were read from the journal. None when the file can't be appended to, as it's from before
+    journals or ends with an interrupted append.
+    """
+
+    @classmethod
+    def read(cls, path: Path) -> typing.Self:
+        with path.open() as file:
+            try:
+                header = json.loads(file.readline())
+            except json.JSONDecodeError:
+                header = None
+
+            if not isinstance(header, dict) or header.get("format") != JOURNAL_FORMAT:
+                file.seek(0)
+                data = json.load(file)
+                return cls(
+                    name=data["project_name"],
+                    game=Game(data["game"]),
+                    operations=[_decode_operation(op) for op in data["operations"]],
+                )
+
+            operations = []
+            records = 0
+            interrupted = False
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # An interrupted append can only affect the last line
+                    interrupted = True
+                    break
+
+                records += 1
+                if "pop" in record:
+                    del operations[len(operations) - record["pop"] :]
+                else:
+                    operations.append(_decode_operation(record))
+
+        return cls(header["project_name"], Game(header["game"]), operations, None if interrupted else records)
+
+    def write(self, path: Path) -> None:
+        """Writes the whole file again, with one record per operation."""
+        header = {
+            "format": JOURNAL_FORMAT,
+            "schema_version": 2,
+            "pwime_version": {
+                "name": pwime.version.__version__,
+            },
+            "project_name": self.name,
+            "game": self.game.value,
+        }
+        lines = [_json_line(header), *(_json_line(_encode_operation(op)) for op in self.operations)]
+        write_atomically(path, "".join(lines).encode("utf-8"))
+
+
+class ProjectJournal:
+    """
+    Saves a project to a file, only appending records for the operations that changed since the last save.
+    After REWRITE_INTERVAL records, the file is written again from scratch, dropping removed operations.
+    Can be used from multiple threads.
+    """
+
+    def __init__(self, path: Path, saved_operations: list[PerformedOperation] | None = None, records: int = 0):
+        """
+        :param saved_operations: The operations already in the file, or None if the file must be written from scratch.
+        :param records: How many records the file has since it was last written from scratch.
+        """
+        self.path = path
+        self._saved_operations = saved_operations
+        self._records = records
+        self._lock = threading.Lock()
+
+    def save(self, name: str, game: Game, operations: list[PerformedOperation]) -> None:
+        operations = list(operations)
+
+        with self._lock:
+            saved = self._saved_operations
+            if saved is None:
+                common = 0
+            else:
+                common = next(
+                    (i for i, (old, new) in enumerate(zip(saved, operations)) if old is not new),
+                    min(len(saved), len(operations)),
+                )
+
+            records = []
+            if saved is not None and len(saved) > common:
+                records.append({"pop": len(saved) - common})
+            records.extend(_encode_operation(op) for op in operations[common:])
+
+            if saved is None or self._records + len(records) > REWRITE_INTERVAL:
+                ProjectFile(name, game, operations).write(self.path)
+                self._records = 0
+            elif records:
+                with self.path.open("a") as file:
+                    file.write("".join(_json_line(record) for record in records))
+                self._records += len(records)
+
+            self._saved_operations = operations
+
+
+def _ignore_progress(progress: float, name: str, bytes: int) -> None:
+    pass
+
+
+def _write_base_game(provider: FileProvider, output: Path) -> None:
+    """Writes the unmodified game into `output`, as an extracted game."""
+    import nod  # noqa: PLC0415
+
+    if isinstance(provider, PathFileProvider):
+        check_separate_games(provider.root, output)
+        output.mkdir(parents=True, exist_ok=True)
+        link_extracted_game(provider.root, output)
+        return
+
+    output.mkdir(parents=True, exist_ok=True)
+    # Extracting writes into the files already there, which may be links to a cached export
+    with tempfile.TemporaryDirectory(dir=output.parent) as extracted:
+        disc, _ = nod.open_disc_from_image(provider_path(provider))
+        disc.get_data_partition().extract_to_directory(extracted, nod.ExtractionContext())
+        link_extracted_game(Path(extracted), output)
+
+
+class PreparedExport:
+    """
+    An export with the modified files already encoded, from `Project.prepare_export`.
+    Writing it doesn't use the asset manager, so it can happen in another thread while the project is used.
+    """
+
+    def __init__(
+        self,
+        provider: FileProvider,
+        path: Path,
+        incremental: bool,
+        cache: ExportCache | None,
+        modified: tempfile.TemporaryDirectory | None,
+    ):
+        self.provider = provider
+        self.path = path
+        self.incremental = incremental
+        self.cache = cache
+        self.modified = modified
+
+    def write(self, progress_callback: ProgressCallback = _ignore_progress) -> None:
+        """Writes the export to its path. Nothing is written when it was restored from the export cache."""
+        if self.modified is None:
+            return
+
+        try:
+            self._write(Path(self.modified.name), progress_callback)
+            if self.cache is not None:
+                self.cache.store(self.path)
+        finally:
+            self.modified.cleanup()
+
+    def _write(self, modified: Path, progress_callback: ProgressCallback) -> None:
+        import nod  # noqa: PLC0415
+
+        path = self.path
+        provider = self.provider
+        suffix = path.suffix.lower()
+        if suffix not in {".iso", ".bps"}:
+            _write_base_game(provider, path)
+            link_extracted_game(modified, path)
+            return
+
+        if suffix == ".bps":
+            # Replaced instead of written to, in case it's a link to a cached export
+            path.unlink(missing_ok=True)
+            write_bps_patch(provider_path(provider), path, modified)
+            return
+
+        if isinstance(provider, IsoFileProvider):
+            try:
+                patch_disc(provider.iso_path, path, modified, progress_callback, incremental=self.incremental)
+                return
+            except UnsupportedPatchError as e:
+                logging.getLogger(__name__).info("Building the disc from scratch, as it can't be patched: %s", e)
+
+        with tempfile.TemporaryDirectory() as game:
+            _write_base_game(provider, Path(game))
+            link_extracted_game(modified, Path(game))
+
+            path.unlink(missing_ok=True)
+            disc_builder = nod.DiscBuilderGCN(os.fspath(path), progress_callback)
+            disc_builder.build_from_directory(game)
+
+
 class Project:
     name: str
     asset_manager: OurAssetManager
@@ -28,6 +297,12 @@ class Project:
         self.asset_manager = manager
         self.performed_operations = []
         self._threshold_to_overwrite = datetime.timedelta(minutes=1)
+        self._journal: ProjectJournal | None = None
+        # Held while saving, which happens both from the UI and the autosave thread
+        self._save_lock = threading.Lock()
+        # How many of the first operations were never performed, as their results came from a checkpoint
+        self._restored_operations = 0
+        self._checkpointed_operations = 0
 
     def add_new_operation(self, operation: Operation) -> None:
         """Performs the operation and records it, ensuring we can undo it later and is persisted."""
@@ -38,62 +313,208 @@ class Project:
             if now - last_op.moment < self._threshold_to_overwrite and operation.overwrites_operation(
                 last_op.operation
             ):
-                last_op.operation.undo(self)
-                self.performed_operations.pop()
+                self.revert_to(len(self.performed_operations) - 1)
 
         operation.perform(self)
         self.performed_operations.append(PerformedOperation(operation, now))
 
-    def save_to_file(self, path: Path) -> None:
-        data = {
-            "schema_version": 1,
-            "pwime_version": {
-                "name": pwime.version.__version__,
-            },
-            "project_name": self.name,
-            "game": self.asset_manager.target_game.value,
-            "operations": [
-                {
-                    "time": operation.moment.astimezone(datetime.UTC).isoformat(),
-                    "data": operation.operation.to_json(),
-                }
-                for operation in self.performed_operations
-            ],
-        }
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text(json.dumps(data, indent=4))
+    def revert_to(self, count: int) -> None:
+        """
+        Undoes all operations after the first `count`, most recent first.
+        Operations whose results came from a checkpoint can't be undone, so reverting any of these instead discards
+        all modifications and replays the remaining operations from the ISO.
+        """
+        if count < self._restored_operations:
+            del self.performed_operations[count:]
+            self._restored_operations = 0
+            self.asset_manager.discard_modifications()
+            self._defer_operations(self.performed_operations)
+            return
 
-    @classmethod
-    def load_from_file(cls, path: Path, providers: Providers) -> typing.Self:
-        with path.open() as file:
-            data = json.load(file)
+        while len(self.performed_operations) > count:
+            operation = self.performed_operations.pop().operation
+            # Undo requires it to have been performed, which is deferred for operations loaded from a file
+            self.asset_manager.apply_deferred_changes(operation.target_asset())
+            operation.undo(self)
+
+    def _defer_operations(self, operations: Sequence[PerformedOperation]) -> None:
+        for performed in operations:
+            # Only performed once the asset is needed, so opening a project doesn't parse every modified asset
+            operation = performed.operation
+            self.asset_manager.defer_change(operation.target_asset(), functools.partial(operation.perform, self))
 
-        game = Game(data["game"])
-        manager = OurAssetManager(providers[game], game)
+    def compact(self) -> None:
+        """Merges operations that modify the same things, see `compact_operations`."""
+        self.performed_operations = compact_operations(self.performed_operations)
 
-        result = cls(data["project_name"], manager)
-        for op in data["operations"]:
-            result.performed_operations.append(
-                PerformedOperation(serializer.decode_from_json(op["data"]), datetime.datetime.fromisoformat(op["time"]))
+    @functools.cached_property
+    def _iso_key(self) -> str:
+        return IsoIdentity.from_path(provider_path(self.asset_manager.provider)).cache_key
+
+    def create_checkpoint(self) -> ProjectCheckpoint:
+        """
+        Encodes all assets modified so far. Applies all deferred operations, so can't be used from other threads.
+        :raise ValueError: If the results of some operations aren't in the asset manager anymore, as a checkpoint
+        without them would lose these operations when loading it.
+        """
+        operations = list(self.performed_operations)
+        assets = self.asset_manager.encode_modified_assets()
+        missing = {performed.operation.target_asset() for performed in operations} - assets.keys()
+        if missing:
+            raise ValueError(
+                f"Modified assets {', '.join(f'0x{asset_id:08X}' for asset_id in sorted(missing))}"
+                " aren't in the asset manager"
             )
-            result.performed_operations[-1].operation.perform(result)
 
+        self._checkpointed_operations = len(operations)
+        return ProjectCheckpoint(
+            operation_count=len(operations),
+            operations_hash=_operations_hash(operations),
+            iso_key=self._iso_key,
+            pwime_version=pwime.version.__version__,
+            retro_data_structures_version=retro_data_structures_version(),
+            assets=assets,
+        )
+
+    def create_checkpoint_if_due(self) -> ProjectCheckpoint | None:
+        """
+        Creates a checkpoint once CHECKPOINT_INTERVAL operations were performed since the last one.
+        None when it's not due, or can't be created, see `create_checkpoint`.
+        """
+        if len(self.performed_operations) - self._checkpointed_operations < CHECKPOINT_INTERVAL:
+            return None
+        try:
+            return self.create_checkpoint()
+        except ValueError as e:
+            # Loading the project then performs all operations again, which is slower but loses nothing
+            logging.getLogger(__name__).warning("Not creating a checkpoint: %s", e)
+            return None
+
+    def save_to_file(self, path: Path, checkpoint: ProjectCheckpoint | None = None) -> None:
+        """
+        Saves the project. When saving to the same file as before, only the changes since then are written.
+        The checkpoint, if given, is stored next to the project file, making loading it faster.
+        Safe to call from another thread, such as for autosaving.
+        """
+        with self._save_lock:
+            if self._journal is None or self._journal.path != path:
+                self._journal = ProjectJournal(path)
+            self._journal.save(self.name, self.asset_manager.target_game, self.performed_operations)
+
+            if checkpoint is not None:
+                checkpoint.write(checkpoint_path(path))
+
+    @classmethod
+    def load_from_file(cls, path: Path, providers: Providers, cache_parsed_assets: bool = False) -> typing.Self:
+        project_file = ProjectFile.read(path)
+        game = project_file.game
+        manager = OurAssetManager(providers[game], game, cache_parsed_assets=cache_parsed_assets)
+        return cls.from_project_file(path, project_file, manager)
+
+    @classmethod
+    def from_project_file(cls, path: Path, project_file: ProjectFile, manager: OurAssetManager) -> typing.Self:
+        """
+        Creates the project stored at `path`, already read as `project_file`, using the given manager.
+        The manager must be for the project's game, and must have no modifications.
+        """
+        result = cls(project_file.name, manager)
+        result.performed_operations = project_file.operations
+        if project_file.journal_records is not None:
+            result._journal = ProjectJournal(path, list(project_file.operations), project_file.journal_records)
+
+        checkpoint = ProjectCheckpoint.read(checkpoint_path(path))
+        if (
+            checkpoint is not None
+            and checkpoint.operation_count <= len(project_file.operations)
+            and checkpoint.iso_key == result._iso_key
+            # Assets encoded by other versions may differ from what these would encode
+            and checkpoint.pwime_version == pwime.version.__version__
+            and checkpoint.retro_data_structures_version == retro_data_structures_version()
+            and checkpoint.operations_hash == _operations_hash(project_file.operations[: checkpoint.operation_count])
+        ):
+            manager.restore_modified_assets(checkpoint.assets)
+            result._restored_operations = result._checkpointed_operations = checkpoint.operation_count
+
+        result._defer_operations(project_file.operations[result._restored_operations :])
         return result
 
-    def export_to(self, path: Path) -> None:
-        import nod  # noqa: PLC0415
+    def _export_cache_key(self, path: Path) -> str:
+        suffix = path.suffix.lower()
+        # Without when each was performed, and merged, so only what affects the result is included
+        operations = compact_operations(self.performed_operations)
+        key = {
+            "pwime_version": pwime.version.__version__,
+            "retro_data_structures_version": retro_data_structures_version(),
+            "iso": self._iso_key,
+            "kind": suffix if suffix in {".iso", ".bps"} else "directory",
+            "operations": [performed.operation.to_json() for performed in operations],
+        }
+        return hashlib.blake2b(json.dumps(key, sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
 
-        context = nod.ExtractionContext()
+    def prepare_export(
+        self,
+        path: Path,
+        *,
+        incremental: bool = False,
+        use_cache: bool = False,
+        jobs: int | None = None,
+    ) -> PreparedExport:
+        """
+        Does the part of `export_to` that uses the asset manager, which is encoding the modified files.
+        The rest is done by `PreparedExport.write`, which can run in another thread.
+        When the result is in the export cache, it's restored here instead, and there's nothing left to write.
+        :raise ValueError: When `path` is the game being modified, or overlaps it.
+        """
+        provider = self.asset_manager.provider
+        if path.exists() and path.samefile(provider_path(provider)):
+            raise ValueError(f"Can't export to {path}, as it's the game being modified")
 
-        self.asset_manager.flush_modified_assets()
+        suffix = path.suffix.lower()
+        if suffix not in {".iso", ".bps"} and isinstance(provider, PathFileProvider):
+            check_separate_games(provider.root, path)
+        if suffix == ".bps" and not isinstance(provider, IsoFileProvider):
+            raise UnsupportedPatchError("Patches can only be made for an ISO, not an extracted game")
 
-        def progress_callback(progress: float, name: str, bytes: int) -> None:
-            pass
+        cache = None
+        if use_cache:
+            cache = ExportCache(self._export_cache_key(path))
+            if cache.restore(path, suffix not in {".iso", ".bps"}):
+                return PreparedExport(provider, path, incremental, None, None)
 
-        with tempfile.TemporaryDirectory() as d:
-            tmp_path = Path(d)
-            self.asset_manager.provider.data.extract_to_directory(d, context)
-            self.asset_manager.save_modifications(tmp_path.joinpath("files"))
+        modified = tempfile.TemporaryDirectory()
+        try:
+            self.asset_manager.flush_modified_assets(jobs)
+            self.asset_manager.save_modifications(ReplacingFileWriter(Path(modified.name)))
 
-            disc_builder = nod.DiscBuilderGCN(os.fspath(path), progress_callback)
-            disc_builder.build_from_directory(d)
+            # An empty list of custom names is the same as not having the file
+            custom_names = Path(modified.name, "files", "custom_names.json")
+            if not provider.is_file("custom_names.json") and json.loads(custom_names.read_text()) == {}:
+                custom_names.unlink()
+        except BaseException:
+            modified.cleanup()
+            raise
+
+        return PreparedExport(provider, path, incremental, cache, modified)
+
+    def export_to(
+        self,
+        path: Path,
+        progress_callback: ProgressCallback = _ignore_progress,
+        *,
+        incremental: bool = False,
+        use_cache: bool = False,
+        jobs: int | None = None,
+    ) -> None:
+        """
+        Exports the game with all modifications. Paths ending in .iso get a disc image, paths ending in .bps get a
+        patch for the ISO (see `write_bps_patch`) and others an extracted game.
+        Disc images are made by patching the modified files into a copy of the ISO when possible, see `patch_disc`.
+        With `incremental`, exporting again to the same path only writes the files that changed since then.
+        Otherwise, the whole game is extracted and a new disc is built from it.
+        With `use_cache`, the result is kept in an `ExportCache`, keyed by the operations, the ISO and the versions
+        of pwime and retro-data-structures. Exporting the same again then only links to the cached result.
+        :param jobs: How many processes encode the modified assets, see `flush_modified_assets`.
+        :raise UnsupportedPatchError: When exporting a patch, but the ISO can't be patched.
+        :raise ValueError: When `path` is the game being modified, or overlaps it.
+        """
+        self.prepare_export(path, incremental=incremental, use_cache=use_cache, jobs=jobs).write(progress_callback)
@@ -0,0 +1,28 @@
+import tempfile
+from pathlib import Path
+
+from appdirs import AppDirs
+
+cache_dirs = AppDirs("pwime", False)
+
+
+def get_cache_path(*parts: str) -> Path:
+    """Path inside the user's cache directory for pwime. Contents may be deleted at any time."""
+    return Path(cache_dirs.user_cache_dir).joinpath(*parts)
+
+
+def write_atomically(path: Path, data: bytes) -> None:
+    """
+    Writes the file so other processes either see the previous contents or all of the new ones.
+    Concurrent writes each use their own temporary file, so the last one to finish wins.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file = tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False)
+    temp_path = Path(file.name)
+    try:
+        with file:
+            file.write(data)
+        temp_path.replace(path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
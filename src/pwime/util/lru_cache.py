@@ -0,0 +1,98 @@
+import collections
+import weakref
+
+
+class LruCache[K, V]:
+    """
+    Keeps values up to a total size, discarding the least recently used ones when over budget.
+    Discarded values are still returned while something else keeps them alive, to avoid two copies of the same value.
+    """
+
+    budget: int
+    resident_size: int
+    hits: int
+    misses: int
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.resident_size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: collections.OrderedDict[K, tuple[V, int]] = collections.OrderedDict()
+        self._evicted: dict[K, tuple[weakref.ref[V], int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries or key in self._evicted
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key: K) -> V | None:
+        """Gets the value for the key, marking it as the most recently used. Counts towards the hit rate."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+        if key in self._evicted:
+            ref, size = self._evicted.pop(key)
+            value = ref()
+            if value is not None:
+                self.hits += 1
+                self.put(key, value, size)
+                return value
+
+        self.misses += 1
+        return None
+
+    def peek(self, key: K) -> V | None:
+        """Gets the value for the key, without changing the order of use or the hit rate."""
+        if key in self._entries:
+            return self._entries[key][0]
+        return None
+
+    def put(self, key: K, value: V, size: int) -> None:
+        self.pop(key)
+        self._entries[key] = (value, size)
+        self.resident_size += size
+        self._evict()
+
+    def pop(self, key: K) -> V | None:
+        """Removes the key from the cache, returning the value if it was present."""
+        if key in self._entries:
+            value, size = self._entries.pop(key)
+            self.resident_size -= size
+            return value
+
+        if key in self._evicted:
+            return self._evicted.pop(key)[0]()
+
+        return None
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._evicted.clear()
+        self.resident_size = 0
+
+    def _evict(self) -> None:
+        # Always keep the most recent entry, even if it alone goes over the budget
+        while self.resident_size > self.budget and len(self._entries) > 1:
+            key, (value, size) = self._entries.popitem(last=False)
+            self.resident_size -= size
+            self._remember_evicted(key, value, size)
+
+    def _remember_evicted(self, key: K, value: V, size: int) -> None:
+        def forget(ref: weakref.ref[V]) -> None:
+            if key in self._evicted and self._evicted[key][0] is ref:
+                del self._evicted[key]
+
+        try:
+            self._evicted[key] = (weakref.ref(value, forget), size)
+        except TypeError:
+            # Value doesn't support weak references, so it's just dropped.
+            pass
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import dataclasses
+import time
+from typing import TYPE_CHECKING
+
+from pwime.batch import base_manager, map_with_base_manager, used_assets
+from pwime.project import Project, ProjectFile
+
+if TYPE_CHECKING:
+    import argparse
+    from collections.abc import Sequence
+    from pathlib import Path
+
+    from pwime.project import PerformedOperation
+
+
+@dataclasses.dataclass(frozen=True)
+class VerifyResult:
+    project: Path
+    seconds: float
+    problems: list[str]
+
+
+def replay_operations(project: Project, operations: Sequence[PerformedOperation]) -> list[str]:
+    """
+    Performs the operations in order, checking each with `Operation.validate` first. Operations with problems aren't
+    performed, so the ones after them are still checked. Then the modified assets are encoded, without saving them.
+    :return: Every problem found, along with the operation that has it.
+    """
+    problems = []
+
+    for index, performed in enumerate(operations):
+        operation = performed.operation
+        try:
+            operation_problems = operation.validate(project)
+            if not operation_problems:
+                operation.perform(project)
+                project.performed_operations.append(performed)
+        except Exception as e:
+            operation_problems = [f"{type(e).__name__}: {e}"]
+
+        problems.extend(f"Operation {index} ({operation.describe()}): {problem}" for problem in operation_problems)
+
+    try:
+        project.asset_manager.encode_modified_assets()
+    except Exception as e:
+        problems.append(f"Encoding the modified assets failed: {type(e).__name__}: {e}")
+
+    return problems
+
+
+def _verify(path: Path) -> VerifyResult:
+    start = time.perf_counter()
+    try:
+        project_file = ProjectFile.read(path)
+        manager = base_manager()
+        if project_file.game != manager.target_game:
+            raise ValueError(f"The project is for {project_file.game.name}, not {manager.target_game.name}")
+
+        # Checkpoints are ignored, as every operation must be performed to be checked
+        problems = replay_operations(Project(project_file.name, manager), project_file.operations)
+    except Exception as e:
+        problems = [f"{type(e).__name__}: {e}"]
+
+    return VerifyResult(path, time.perf_counter() - start, problems)
+
+
+def run_cli(args: argparse.Namespace) -> None:
+    projects: list[Path] = args.projects
+
+    start = time.perf_counter()
+    failures = 0
+
+    for result in map_with_base_manager(
+        _verify,
+        projects,
+        args.jobs,
+        args.base_iso,
+        args.game,
+        memory_map=args.memory_map,
+        preload=used_assets(projects),
+    ):
+        if result.problems:
+            failures += 1
+            print(f"{result.project} has {len(result.problems)} problems, found in {result.seconds:.1f}s:")
+            for problem in result.problems:
+                print(f"  {problem}")
+        else:
+            print(f"{result.project} applies cleanly, checked in {result.seconds:.1f}s.")
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(projects) - failures} of {len(projects)} projects apply cleanly, checked in {elapsed:.1f}s.")
+    if failures:
+        raise SystemExit(1)
@@ -0,0 +1,97 @@
+import os
+import struct
+import typing
+from pathlib import Path
+
+import pytest
+
+from pwime import disc_patch
+
+_DOL_OFFSET = 0x4000
+_FST_OFFSET = 0x5000
+_FIRST_FILE_OFFSET = 0x8000
+
+MAIN_DOL = bytearray(0x300)
+# A single text section
+struct.pack_into(">I", MAIN_DOL, 0, 0x100)
+struct.pack_into(">I", MAIN_DOL, 0x48, 0x80003100)
+struct.pack_into(">I", MAIN_DOL, 0x90, 0x200)
+struct.pack_into(">I", MAIN_DOL, 0xE0, 0x80003100)
+MAIN_DOL = bytes(MAIN_DOL)
+
+
+def _fst(locations: dict[str, tuple[int, int]]) -> bytes:
+    """The FST for files at the given offset and with the given size, by their path."""
+    # Directories have their parent and the index after their last entry, and the root has the entry count
+    entries: list[list] = [[True, "", 0, 0]]
+
+    def add_directory(prefix: str, index: int) -> None:
+        children = sorted({name[len(prefix) :].split("/")[0] for name in locations if name.startswith(prefix)})
+        for child in children:
+            path = prefix + child
+            if path in locations:
+                entries.append([False, child, *locations[path]])
+            else:
+                entries.append([True, child, index, 0])
+                child_index = len(entries) - 1
+                add_directory(f"{path}/", child_index)
+                entries[child_index][3] = len(entries)
+
+    add_directory("", 0)
+    entries[0][3] = len(entries)
+
+    result = b""
+    names = b""
+    for is_directory, name, offset_or_parent, size_or_next in entries:
+        result += disc_patch._FST_ENTRY.pack((is_directory << 24) | len(names), offset_or_parent, size_or_next)
+        names += name.encode("ascii") + b"\0"
+    return result + names
+
+
+def _write_disc(path: Path, files: dict[str, bytes]) -> None:
+    """
+    Writes a small GameCube disc with the given files, with only what patching and reading files needs.
+    Each file starts at a multiple of 0x8000, in the order given.
+    """
+    locations = {}
+    offset = _FIRST_FILE_OFFSET
+    for name, data in files.items():
+        locations[name] = (offset, len(data))
+        offset = disc_patch._align(offset + len(data))
+
+    fst = _fst(locations)
+    disc = bytearray(offset)
+    disc[0:6] = b"GM8E01"
+    struct.pack_into(">I", disc, 0x1C, 0xC2339F3D)
+    disc_patch._HEADER_OFFSETS.pack_into(disc, 0x420, _DOL_OFFSET, _FST_OFFSET, len(fst))
+    struct.pack_into(">I", disc, 0x42C, len(fst))
+    # Apploader with 0x100 bytes of code and no trailer
+    struct.pack_into(">II", disc, 0x2440 + 0x14, 0x100, 0)
+
+    disc[_DOL_OFFSET : _DOL_OFFSET + len(MAIN_DOL)] = MAIN_DOL
+    disc[_FST_OFFSET : _FST_OFFSET + len(fst)] = fst
+    for name, (file_offset, size) in locations.items():
+        disc[file_offset : file_offset + size] = files[name]
+
+    path.write_bytes(disc)
+
+
+@pytest.fixture(autouse=True)
+def _cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keeps what tests cache away from the user's cache."""
+    monkeypatch.setenv("XDG_CACHE_HOME", os.fspath(tmp_path.joinpath("cache")))
+
+
+@pytest.fixture
+def disc_writer(tmp_path: Path) -> typing.Callable[[dict[str, bytes]], Path]:
+    """Writes small GameCube discs with the given files into the test's directory, see `_write_disc`."""
+    count = 0
+
+    def write(files: dict[str, bytes]) -> Path:
+        nonlocal count
+        count += 1
+        path = tmp_path.joinpath(f"disc{count}.iso")
+        _write_disc(path, files)
+        return path
+
+    return write
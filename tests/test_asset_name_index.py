@@ -0,0 +1,50 @@
+import pytest
+
+from pwime.asset_name_index import AssetNameIndex, compile_asset_names
+
+NAMES = {
+    "Worlds/TempleGrounds.MLVL": 0x3BFA3EFF,
+    "Strings/English/Áreas.STRG": 0x12,
+    "a.TXTR": 0xFFFFFFFF,
+    "b.TXTR": 0x1,
+}
+
+
+def test_lookup_by_id():
+    index = AssetNameIndex(compile_asset_names(NAMES))
+
+    assert len(index) == len(NAMES)
+    for name, asset_id in NAMES.items():
+        assert asset_id in index
+        assert index[asset_id] == name
+        assert index.get(asset_id) == name
+
+    assert 0x2 not in index
+    assert index.get(0x2) is None
+    assert index.get(0x2, "default") == "default"
+    with pytest.raises(KeyError):
+        index[0x2]
+
+
+def test_find_id():
+    index = AssetNameIndex(compile_asset_names(NAMES))
+
+    for name, asset_id in NAMES.items():
+        assert index.find_id(name) == asset_id
+
+    assert index.find_id("c.TXTR") is None
+    assert index.find_id("") is None
+    assert index.find_id("zzz") is None
+
+
+def test_empty():
+    index = AssetNameIndex(compile_asset_names({}))
+
+    assert len(index) == 0
+    assert index.get(0x1) is None
+    assert index.find_id("a.TXTR") is None
+
+
+def test_invalid_data():
+    with pytest.raises(ValueError, match="Not a compiled asset name index"):
+        AssetNameIndex(b"PWAX" + compile_asset_names(NAMES)[4:])
@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import pytest
+
+from pwime import bps
+
+
+@pytest.fixture
+def source(tmp_path: Path) -> Path:
+    path = tmp_path.joinpath("source.bin")
+    path.write_bytes(bytes(range(256)) * 64)
+    return path
+
+
+def _round_trip(source: Path, tmp_path: Path, target_size: int, changes: list[tuple[int, bytes | Path]]) -> bytes:
+    patch = tmp_path.joinpath("patch.bps")
+    output = tmp_path.joinpath("output.bin")
+    bps.create_patch(source, patch, target_size, changes)
+    bps.apply_patch(source, patch, output)
+    return output.read_bytes()
+
+
+def test_round_trip(source: Path, tmp_path: Path):
+    original = source.read_bytes()
+    from_file = tmp_path.joinpath("change.bin")
+    from_file.write_bytes(b"file" * 100)
+
+    result = _round_trip(source, tmp_path, len(original) + 1000, [(5000, from_file), (10, b"changed")])
+
+    expected = bytearray(original + bytes(1000))
+    expected[10:17] = b"changed"
+    expected[5000:5400] = b"file" * 100
+    assert result == expected
+
+
+def test_round_trip_shrinks(source: Path, tmp_path: Path):
+    assert _round_trip(source, tmp_path, 100, [(0, b"x")]) == b"x" + source.read_bytes()[1:100]
+
+
+def test_identical(source: Path, tmp_path: Path):
+    assert _round_trip(source, tmp_path, source.stat().st_size, []) == source.read_bytes()
+
+
+def test_empty_change(source: Path, tmp_path: Path):
+    assert _round_trip(source, tmp_path, source.stat().st_size, [(20, b"")]) == source.read_bytes()
+
+
+def test_overlapping_changes(source: Path, tmp_path: Path):
+    with pytest.raises(ValueError, match="overlaps"):
+        bps.create_patch(source, tmp_path.joinpath("patch.bps"), 100, [(0, b"abc"), (2, b"d")])
+
+
+def test_corrupted_patch(source: Path, tmp_path: Path):
+    patch = tmp_path.joinpath("patch.bps")
+    bps.create_patch(source, patch, 100, [(0, b"x")])
+    data = bytearray(patch.read_bytes())
+    data[6] ^= 0xFF
+    patch.write_bytes(data)
+
+    with pytest.raises(bps.InvalidPatchError, match="corrupted"):
+        bps.apply_patch(source, patch, tmp_path.joinpath("output.bin"))
+
+
+def test_patch_for_other_file(source: Path, tmp_path: Path):
+    patch = tmp_path.joinpath("patch.bps")
+    bps.create_patch(source, patch, 100, [(0, b"x")])
+    other = tmp_path.joinpath("other.bin")
+    other.write_bytes(b"other")
+
+    with pytest.raises(bps.InvalidPatchError, match="isn't for"):
+        bps.apply_patch(other, patch, tmp_path.joinpath("output.bin"))
@@ -0,0 +1,23 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from pwime.util.cache_dir import write_atomically
+
+
+def test_write_atomically_concurrently(tmp_path: Path):
+    path = tmp_path.joinpath("file")
+    contents = [bytes([i]) * 0x10000 for i in range(8)]
+    barrier = threading.Barrier(len(contents))
+
+    def write(data: bytes) -> None:
+        barrier.wait()
+        for _ in range(20):
+            write_atomically(path, data)
+
+    with ThreadPoolExecutor(len(contents)) as executor:
+        for future in [executor.submit(write, data) for data in contents]:
+            future.result()
+
+    assert path.read_bytes() in contents
+    assert list(tmp_path.iterdir()) == [path]
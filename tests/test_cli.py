@@ -0,0 +1,22 @@
+import pytest
+
+from pwime import cli
+
+
+@pytest.mark.parametrize(
+    ("arguments", "error"),
+    [
+        (["--target-iso", "target.iso"], "one of the arguments --base-iso --base-manifest is required"),
+        (["--base-manifest", "base.json"], "one of the arguments --target-iso --target-manifest is required"),
+        (
+            ["--base-manifest", "base.json", "--target-iso", "target.iso", "--output", "diff.pwimep"],
+            "argument --output: requires both --base-iso and --target-iso",
+        ),
+    ],
+)
+def test_diff_rejects_missing_inputs(arguments: list[str], error: str, capsys: pytest.CaptureFixture[str]):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.run_cli(["pwime", "diff", *arguments])
+
+    assert exit_info.value.code == 2
+    assert capsys.readouterr().err.splitlines()[-1].endswith(f" diff: error: {error}")
@@ -0,0 +1,66 @@
+import datetime
+
+from pwime.gui.editor.strg_window import StrgEditOperation
+from pwime.operations.script_instance import merge_deltas
+from pwime.project import PerformedOperation, compact_operations
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+
+def _performed(*operations: StrgEditOperation) -> list[PerformedOperation]:
+    return [
+        PerformedOperation(operation, START + datetime.timedelta(minutes=i)) for i, operation in enumerate(operations)
+    ]
+
+
+def test_merges_edits_of_same_string():
+    operations = _performed(
+        StrgEditOperation(1, 0, "first", "ENGL", old_value="original"),
+        StrgEditOperation(1, 0, "second", "ENGL", old_value="first"),
+    )
+
+    assert compact_operations(operations) == [
+        PerformedOperation(StrgEditOperation(1, 0, "second", "ENGL", old_value="original"), operations[1].moment),
+    ]
+
+
+def test_keeps_unrelated_edits_in_order():
+    operations = _performed(
+        StrgEditOperation(1, 0, "a", "ENGL"),
+        StrgEditOperation(1, 1, "b", "ENGL"),
+        StrgEditOperation(2, 0, "c", "ENGL"),
+        StrgEditOperation(1, 0, "d", "FREN"),
+    )
+
+    assert compact_operations(operations) == operations
+
+
+def test_merged_operation_placed_at_last_one():
+    operations = _performed(
+        StrgEditOperation(1, 0, "a", "ENGL", old_value="original"),
+        StrgEditOperation(1, 1, "b", "ENGL"),
+        StrgEditOperation(1, 0, "c", "ENGL", old_value="a"),
+    )
+
+    assert compact_operations(operations) == [
+        operations[1],
+        PerformedOperation(StrgEditOperation(1, 0, "c", "ENGL", old_value="original"), operations[2].moment),
+    ]
+
+
+def test_drops_overwritten_edits():
+    operations = _performed(
+        StrgEditOperation(1, 0, "english", "ENGL"),
+        StrgEditOperation(1, 0, "everything", None),
+    )
+
+    # Can't be merged, as they change different languages, but the later one replaces the earlier
+    assert compact_operations(operations) == [operations[1]]
+
+
+def test_merge_deltas():
+    first = {"0x1": 1, "0x2": {"0x3": 3, "0x4": 4}}
+    second = {"0x2": {"0x4": 40, "0x5": 50}, "0x6": 6}
+
+    assert merge_deltas(first, second) == {"0x1": 1, "0x2": {"0x3": 3, "0x4": 40, "0x5": 50}, "0x6": 6}
+    assert first == {"0x1": 1, "0x2": {"0x3": 3, "0x4": 4}}
@@ -0,0 +1,117 @@
+import typing
+from pathlib import Path
+
+import pytest
+
+from pwime import disc_patch
+
+BASE_FILES = {
+    "a.pak": b"A" * 0x100,
+    "sub/b.pak": b"B" * 0x10,
+    "c.txt": b"C" * 0x20,
+}
+
+
+@pytest.fixture
+def base_iso(disc_writer: typing.Callable[[dict[str, bytes]], Path]) -> Path:
+    return disc_writer(BASE_FILES)
+
+
+def _modified(root: Path, files: dict[str, bytes]) -> Path:
+    for name, data in files.items():
+        path = root.joinpath("files", name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return root
+
+
+def _fst_locations(fst: bytes) -> dict[str, tuple[int, int]]:
+    return {
+        name: disc_patch._FST_FILE_LOCATION.unpack_from(fst, index * disc_patch._FST_ENTRY.size + 4)
+        for name, index in disc_patch._fst_file_indices(fst).items()
+    }
+
+
+def _read_file(iso: Path, name: str) -> bytes:
+    with iso.open("rb") as disc:
+        plan = disc_patch._plan_patch(disc, iso.parent.joinpath("no-changes"))
+    offset, size = _fst_locations(plan.fst)[name]
+    with iso.open("rb") as disc:
+        disc.seek(offset)
+        return disc.read(size)
+
+
+def test_plan_patch_relocates_grown_file(base_iso: Path, tmp_path: Path):
+    grown = b"G" * 0x9000
+    modified = _modified(tmp_path.joinpath("modified"), {"sub/b.pak": grown, "a.pak": b"a" * 0x100})
+
+    with base_iso.open("rb") as disc:
+        original = disc_patch._plan_patch(disc, tmp_path.joinpath("no-changes"))
+        plan = disc_patch._plan_patch(disc, modified)
+
+    before = _fst_locations(original.fst)
+    after = _fst_locations(plan.fst)
+    replacements = {replacement.name: replacement for replacement in plan.replacements}
+
+    # Same size, so it's written where it was
+    assert after["a.pak"] == before["a.pak"]
+    assert replacements["a.pak"].offset == before["a.pak"][0]
+
+    # Grown, so it's moved to free space that doesn't overlap anything else
+    offset, size = after["sub/b.pak"]
+    assert size == len(grown)
+    assert offset != before["sub/b.pak"][0]
+    assert offset % 0x8000 == 0
+    assert replacements["sub/b.pak"].offset == offset
+    for name, (other_offset, other_size) in before.items():
+        if name != "sub/b.pak":
+            assert offset + size <= other_offset or other_offset + other_size <= offset
+
+    assert after["c.txt"] == before["c.txt"]
+    assert plan.fst_offset == original.fst_offset
+    assert plan.header == original.header
+
+
+def test_plan_patch_rejects_new_files(base_iso: Path, tmp_path: Path):
+    modified = _modified(tmp_path.joinpath("modified"), {"new.pak": b"N"})
+
+    with base_iso.open("rb") as disc, pytest.raises(disc_patch.UnsupportedPatchError):
+        disc_patch._plan_patch(disc, modified)
+
+
+def test_patch_disc(base_iso: Path, tmp_path: Path):
+    grown = b"G" * 0x9000
+    modified = _modified(tmp_path.joinpath("modified"), {"sub/b.pak": grown})
+    output = tmp_path.joinpath("output.iso")
+
+    disc_patch.patch_disc(base_iso, output, modified, lambda *args: None)
+
+    assert _read_file(output, "sub/b.pak") == grown
+    assert _read_file(output, "a.pak") == BASE_FILES["a.pak"]
+    assert _read_file(output, "c.txt") == BASE_FILES["c.txt"]
+
+
+def test_incremental_patch_matches_full_patch(base_iso: Path, tmp_path: Path):
+    incremental = tmp_path.joinpath("incremental.iso")
+    full = tmp_path.joinpath("full.iso")
+
+    first = _modified(tmp_path.joinpath("first"), {"sub/b.pak": b"G" * 0x9000, "a.pak": b"a" * 0x100})
+    disc_patch.patch_disc(base_iso, incremental, first, lambda *args: None, incremental=True)
+
+    # Shrinks the moved file back, changes another and leaves a.pak as the base disc has it
+    second = _modified(tmp_path.joinpath("second"), {"sub/b.pak": b"g" * 0x10, "c.txt": b"c" * 0x20})
+    written = []
+    disc_patch.patch_disc(base_iso, incremental, second, lambda *args: written.append(args[2]), incremental=True)
+    disc_patch.patch_disc(base_iso, full, second, lambda *args: None)
+
+    assert incremental.read_bytes() == full.read_bytes()
+    # Only what the previous patch wrote and the new files, instead of the whole disc
+    assert written[-1] < base_iso.stat().st_size
+
+
+def test_patch_disc_refuses_source(base_iso: Path, tmp_path: Path):
+    modified = _modified(tmp_path.joinpath("modified"), {"a.pak": b"a" * 0x100})
+
+    with pytest.raises(ValueError, match="being read"):
+        disc_patch.patch_disc(base_iso, base_iso, modified, lambda *args: None)
+    assert _read_file(base_iso, "a.pak") == BASE_FILES["a.pak"]
@@ -0,0 +1,35 @@
+from pathlib import Path
+
+import pytest
+
+from pwime.file_provider import link_extracted_game
+
+
+@pytest.fixture
+def extracted_game(tmp_path: Path) -> Path:
+    root = tmp_path.joinpath("game")
+    root.joinpath("files").mkdir(parents=True)
+    root.joinpath("files", "a.pak").write_bytes(b"A")
+    root.joinpath("sys").mkdir()
+    root.joinpath("sys", "main.dol").write_bytes(b"D")
+    return root
+
+
+def test_link_extracted_game(extracted_game: Path, tmp_path: Path):
+    output = tmp_path.joinpath("output")
+    output.joinpath("files").mkdir(parents=True)
+    output.joinpath("files", "a.pak").write_bytes(b"old")
+
+    link_extracted_game(extracted_game, output)
+
+    assert output.joinpath("files", "a.pak").read_bytes() == b"A"
+    assert output.joinpath("sys", "main.dol").read_bytes() == b"D"
+
+
+@pytest.mark.parametrize("output", [".", "files", "..", "../game/sys/.."])
+def test_link_extracted_game_refuses_overlap(extracted_game: Path, output: str):
+    with pytest.raises(ValueError, match="overlaps"):
+        link_extracted_game(extracted_game, extracted_game.joinpath(output))
+
+    assert extracted_game.joinpath("files", "a.pak").read_bytes() == b"A"
+    assert extracted_game.joinpath("sys", "main.dol").read_bytes() == b"D"
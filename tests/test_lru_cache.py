@@ -0,0 +1,59 @@
+from pwime.util.lru_cache import LruCache
+
+
+class Value:
+    """Something that supports weak references, unlike bytes or ints."""
+
+
+def test_evicts_least_recently_used_by_size():
+    cache = LruCache[str, bytes](10)
+    cache.put("a", b"a", 4)
+    cache.put("b", b"b", 4)
+    assert cache.get("a") == b"a"
+
+    cache.put("c", b"c", 4)
+
+    assert cache.peek("b") is None
+    assert "b" not in cache
+    assert cache.get("a") == b"a"
+    assert cache.get("c") == b"c"
+    assert len(cache) == 2
+    assert cache.resident_size == 8
+
+
+def test_keeps_newest_entry_over_budget():
+    cache = LruCache[str, bytes](10)
+    cache.put("a", b"a", 4)
+    cache.put("big", b"big", 20)
+
+    assert len(cache) == 1
+    assert cache.peek("big") == b"big"
+    assert cache.resident_size == 20
+
+
+def test_replacing_updates_size():
+    cache = LruCache[str, bytes](10)
+    cache.put("a", b"a", 4)
+    cache.put("a", b"aa", 6)
+
+    assert len(cache) == 1
+    assert cache.resident_size == 6
+    assert cache.pop("a") == b"aa"
+    assert cache.resident_size == 0
+
+
+def test_evicted_values_returned_while_alive():
+    cache = LruCache[str, Value](10)
+    kept = Value()
+    cache.put("kept", kept, 8)
+    cache.put("dropped", Value(), 8)
+    cache.put("new", Value(), 8)
+
+    assert "kept" in cache
+    assert "dropped" not in cache
+    assert cache.get("kept") is kept
+    assert cache.peek("kept") is kept
+    assert cache.get("dropped") is None
+    assert cache.hits == 1
+    assert cache.misses == 1
+    assert cache.hit_rate == 0.5
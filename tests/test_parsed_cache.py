@@ -0,0 +1,36 @@
+from construct import Container
+from retro_data_structures.formats.mlvl import Mlvl
+from retro_data_structures.formats.mrea import Area, Mrea
+from retro_data_structures.formats.script_layer import ScriptLayer
+from retro_data_structures.formats.strg import Strg
+from retro_data_structures.game_check import Game
+
+from pwime.parsed_cache import dump_resource, dump_resource_for_build, load_resource
+
+
+def test_dump_resource_for_build_leaves_out_references():
+    areas = [Container(area_mrea_id=index, data=b"M" * 0x1000) for index in range(10)]
+    mlvl = Mlvl(Container(areas=areas), Game.ECHOES)
+    area = Area(mlvl, 0)
+    mrea = Mrea(Container(sections=Container(script_layers_section=[b"L"])), Game.ECHOES)
+    mrea._script_layer_helpers = {0: ScriptLayer(Container(objects=[]), 0, Game.ECHOES).with_parent(area)}
+    area._mrea = mrea
+
+    pickled = dump_resource_for_build(mrea)
+    loaded = load_resource(pickled, None)
+
+    assert loaded._script_layer_helpers[0]._parent_area is None
+    assert loaded._script_layer_helpers[0]._raw == Container(objects=[])
+    assert loaded._raw == mrea._raw
+    # Not the whole world through the area
+    assert len(pickled) < len(dump_resource(mrea)) // 10
+
+
+def test_dump_resource_for_build_builds_the_same():
+    strg = Strg(Container(languages={"ENGL": ["zero", "one"]}, name_table=None), Game.PRIME)
+    strg.other = Strg(Container(languages={"ENGL": ["other"]}, name_table=None), Game.PRIME)
+
+    loaded = load_resource(dump_resource_for_build(strg), None)
+
+    assert loaded.other is None
+    assert loaded.build() == strg.build()
@@ -0,0 +1,112 @@
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from construct import Container
+from retro_data_structures.file_provider import IsoFileProvider
+from retro_data_structures.formats.pak import Pak
+from retro_data_structures.formats.pak_common import PakBody, PakFile
+from retro_data_structures.formats.strg import Strg
+from retro_data_structures.game_check import Game
+
+from pwime import project
+from pwime.asset_manager import OurAssetManager
+from pwime.gui.editor.strg_window import StrgEditOperation
+from pwime.project import Project, ProjectFile
+
+STRG_ID = 0x1234
+
+
+@pytest.fixture
+def game_iso(disc_writer: typing.Callable[[dict[str, bytes]], Path]) -> Path:
+    """A disc with a single pak, which has a single STRG."""
+    strg = Strg(Container(languages={"ENGL": ["zero", "one"]}, name_table=None), Game.PRIME)
+    pak = Pak(PakBody(named_resources=[], files=[PakFile(STRG_ID, "STRG", False, strg.build(), None)]), Game.PRIME)
+    return disc_writer({"Strings.pak": pak.build()})
+
+
+def _manager(iso: Path) -> OurAssetManager:
+    manager = OurAssetManager(IsoFileProvider(iso), Game.PRIME)
+    # Only set for Echoes by retro-data-structures, but saving always uses it
+    manager.tweaks = None
+    return manager
+
+
+def _strings(iso: Path) -> tuple[str, ...]:
+    return _manager(iso).get_file(STRG_ID, Strg).get_strings()
+
+
+def test_checkpoint_after_export(game_iso: Path, tmp_path: Path):
+    path = tmp_path.joinpath("project.pwimep")
+    edited = Project("Project", _manager(game_iso))
+    edited.add_new_operation(StrgEditOperation(STRG_ID, 0, "ZERO", "ENGL"))
+    edited.export_to(tmp_path.joinpath("first.iso"))
+
+    # Exporting must not lose the modifications the checkpoint is made of
+    edited.save_to_file(path, edited.create_checkpoint())
+
+    reopened = Project.from_project_file(path, ProjectFile.read(path), _manager(game_iso))
+    assert reopened._restored_operations == 1
+    reopened.export_to(tmp_path.joinpath("second.iso"))
+    assert _strings(tmp_path.joinpath("second.iso")) == ("ZERO", "one")
+
+
+def test_checkpoint_refuses_lost_modifications(game_iso: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(project, "CHECKPOINT_INTERVAL", 1)
+    edited = Project("Project", _manager(game_iso))
+    edited.add_new_operation(StrgEditOperation(STRG_ID, 0, "ZERO", "ENGL"))
+    edited.asset_manager.discard_modifications()
+
+    with pytest.raises(ValueError, match="0x00001234"):
+        edited.create_checkpoint()
+    assert edited.create_checkpoint_if_due() is None
+
+
+def test_export_twice(game_iso: Path, tmp_path: Path):
+    output = tmp_path.joinpath("output.iso")
+    edited = Project("Project", _manager(game_iso))
+    edited.add_new_operation(StrgEditOperation(STRG_ID, 0, "ZERO", "ENGL"))
+    edited.export_to(output, incremental=True)
+    assert _strings(output) == ("ZERO", "one")
+
+    edited.add_new_operation(StrgEditOperation(STRG_ID, 1, "ONE", "ENGL"))
+    edited.export_to(output, incremental=True)
+    edited.export_to(tmp_path.joinpath("full.iso"))
+
+    assert _strings(output) == ("ZERO", "ONE")
+    assert output.read_bytes() == tmp_path.joinpath("full.iso").read_bytes()
+
+
+@pytest.mark.parametrize("suffix", [".iso", ".bps"])
+def test_export_refuses_base_game(game_iso: Path, tmp_path: Path, suffix: str):
+    original = game_iso.read_bytes()
+    # Also through another name for it
+    path = tmp_path.joinpath(f"link{suffix}")
+    path.hardlink_to(game_iso)
+    edited = Project("Project", _manager(game_iso))
+    edited.add_new_operation(StrgEditOperation(STRG_ID, 0, "ZERO", "ENGL"))
+
+    for target in (game_iso, path):
+        with pytest.raises(ValueError, match="game being modified"):
+            edited.export_to(target)
+    assert game_iso.read_bytes() == original
+
+
+def test_save_concurrently(game_iso: Path, tmp_path: Path):
+    path = tmp_path.joinpath("project.pwimep")
+    edited = Project("Project", _manager(game_iso))
+    edited.add_new_operation(StrgEditOperation(STRG_ID, 0, "ZERO", "ENGL"))
+    barrier = threading.Barrier(4)
+
+    def save() -> None:
+        barrier.wait()
+        edited.save_to_file(path)
+
+    with ThreadPoolExecutor(4) as executor:
+        for future in [executor.submit(save) for _ in range(4)]:
+            future.result()
+
+    # A single journal, so the operation isn't appended once per thread
+    assert ProjectFile.read(path).operations == edited.performed_operations
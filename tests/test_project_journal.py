@@ -0,0 +1,96 @@
+import datetime
+from pathlib import Path
+
+import pytest
+from retro_data_structures.game_check import Game
+
+from pwime import project
+from pwime.gui.editor.strg_window import StrgEditOperation
+from pwime.project import PerformedOperation, ProjectFile, ProjectJournal
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+
+def _edit(index: int) -> PerformedOperation:
+    return PerformedOperation(StrgEditOperation(1, index, f"text {index}", "ENGL"), START)
+
+
+def _lines(path: Path) -> int:
+    return len(path.read_text().splitlines())
+
+
+def test_appends_new_operations(tmp_path: Path):
+    path = tmp_path.joinpath("project.pwimep")
+    journal = ProjectJournal(path)
+    operations = [_edit(0), _edit(1)]
+
+    journal.save("Name", Game.ECHOES, operations)
+    operations.append(_edit(2))
+    journal.save("Name", Game.ECHOES, operations)
+
+    assert _lines(path) == 4
+    project_file = ProjectFile.read(path)
+    assert project_file.name == "Name"
+    assert project_file.game == Game.ECHOES
+    assert project_file.operations == operations
+    assert project_file.journal_records == 3
+
+
+def test_pops_removed_operations(tmp_path: Path):
+    path = tmp_path.joinpath("project.pwimep")
+    journal = ProjectJournal(path)
+    operations = [_edit(0), _edit(1), _edit(2)]
+    journal.save("Name", Game.ECHOES, operations)
+
+    # Undo two, then do something else
+    operations = [operations[0], _edit(3)]
+    journal.save("Name", Game.ECHOES, operations)
+
+    assert ProjectFile.read(path).operations == operations
+    assert ProjectFile.read(path).journal_records == 5
+
+
+def test_continues_journal_read_back(tmp_path: Path):
+    path = tmp_path.joinpath("project.pwimep")
+    operations = [_edit(0)]
+    ProjectJournal(path).save("Name", Game.ECHOES, operations)
+
+    project_file = ProjectFile.read(path)
+    journal = ProjectJournal(path, list(project_file.operations), project_file.journal_records)
+    journal.save("Name", Game.ECHOES, [*project_file.operations, _edit(1)])
+
+    assert _lines(path) == 3
+    assert ProjectFile.read(path).operations == [_edit(0), _edit(1)]
+
+
+def test_truncated_trailing_record(tmp_path: Path):
+    path = tmp_path.joinpath("project.pwimep")
+    operations = [_edit(0), _edit(1)]
+    ProjectJournal(path).save("Name", Game.ECHOES, operations)
+    with path.open("a") as file:
+        file.write(project._json_line(project._encode_operation(_edit(2)))[:20])
+
+    project_file = ProjectFile.read(path)
+    assert project_file.operations == operations
+    # Can't be appended to, as the next record would continue the interrupted one
+    assert project_file.journal_records is None
+
+    ProjectJournal(path).save("Name", Game.ECHOES, [*operations, _edit(3)])
+    assert ProjectFile.read(path).operations == [*operations, _edit(3)]
+    assert _lines(path) == 4
+
+
+def test_rewrites_after_interval(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(project, "REWRITE_INTERVAL", 3)
+    path = tmp_path.joinpath("project.pwimep")
+    journal = ProjectJournal(path)
+    operations = [_edit(0)]
+    journal.save("Name", Game.ECHOES, operations)
+
+    for index in range(1, 5):
+        operations = [*operations[:-1], _edit(index)]
+        journal.save("Name", Game.ECHOES, operations)
+
+    assert ProjectFile.read(path).operations == operations
+    # Written from scratch by the last save, without the popped records
+    assert _lines(path) == 1 + len(operations)